@@ -0,0 +1,198 @@
+# async_game_loop.py
+
+import asyncio
+
+import constants
+
+
+class AsyncGameLoop:
+    """
+    An alternative to Game.start_game_loop that runs the game as four cooperative asyncio tasks instead of one
+    blocking loop: input sampling, tetromino logic, sand physics and rendering. Each task runs at its own rate
+    from the Game's Scheduler and sleeps in between, so the others run in its gaps instead of waiting for
+    their turn in a fixed order.
+
+    The tasks share the Game's models and these objects:
+        inputs: the last polled inputs (taps and shakes are latched on the Game, see Game._latch_inputs)
+        models_changed (asyncio.Event): set by the tetromino and sand tasks; the render task waits for it,
+            so nothing is rendered while nothing moves
+        busy_time: the time the tasks spent working since the last render, for the SandQualityGovernor
+            and the profiler
+
+    A profiler frame runs from one render to the next: every task adds the time of its phase to it, and the
+    render task closes it, with the busy time as the frame time.
+
+    asyncio is cooperative, so one I2C read or one physics step still runs to its end once it has started.
+    What changes is that a long one only pushes back the work that was due during it, rather than
+    everything scheduled after it in the frame, and the sand physics step is budgeted so it yields often.
+    The render does not wait for the display either: GraphicsManager.end_frame defers a refresh that comes
+    too soon instead of waiting for its frame slot.
+    """
+
+    def __init__(self, game):
+        """
+        Args:
+            game (Game): The game to run. Its clock must be real time (asyncio.sleep does not move a VirtualClock).
+        """
+        self.game = game
+        self.inputs = None
+        self.models_changed = asyncio.Event()
+        self.busy_time = 0.0
+
+    async def run(self, max_ticks: int = None):
+        """
+        Runs the game until it is over.
+
+        Args:
+            max_ticks (int): Stop after this many ticks even if the game is not over yet.
+        """
+        self.max_ticks = max_ticks
+
+        # The tetromino task needs inputs from its first step
+        self.inputs = self.game.inputs_manager.get_all_inputs()
+        self.game._latch_inputs(self.inputs)
+        self.game.profiler.begin_frame()
+
+        await asyncio.gather(
+            asyncio.create_task(self._inputs_task()),
+            asyncio.create_task(self._tetromino_task()),
+            asyncio.create_task(self._sand_task()),
+            asyncio.create_task(self._render_task()),
+        )
+
+    def _is_running(self) -> bool:
+        game = self.game
+        return not game.is_game_over and (self.max_ticks is None or game.tick_count < self.max_ticks)
+
+    def _stop(self):
+        """ Wakes the render task so that every task sees that the game is over. """
+        self.models_changed.set()
+
+    async def _inputs_task(self):
+        """ Polls the accelerometer at INPUT_RATE. """
+        game = self.game
+        rate = game.scheduler.inputs
+
+        while self._is_running():
+            start = game.clock.monotonic()
+            game.profiler.start(constants.FramePhase.INPUTS)
+            self.inputs = game.inputs_manager.get_all_inputs()
+            game._latch_inputs(self.inputs)
+            game.profiler.stop(constants.FramePhase.INPUTS)
+            self.busy_time += game.clock.monotonic() - start
+
+            await asyncio.sleep(rate.step)
+
+    def _get_tetromino_state(self):
+        """ Returns what the display shows of the active tetromino; it changes when the piece moves, rotates or lands. """
+        game = self.game
+        tetromino = game.active_tetromino
+        return (tetromino.x, tetromino.y, tetromino.orientation, tetromino.shape_type, tetromino.color_type, game.num_tetrominoes_dropped)
+
+    async def _tetromino_task(self):
+        """ Runs the fixed simulation steps (moving, rotating and landing the tetromino), catching up after a delay. """
+        game = self.game
+        rate = game.scheduler.simulation
+        last_time = game.clock.monotonic()
+
+        while self._is_running():
+            now = game.clock.monotonic()
+            num_steps = rate.advance(now - last_time)
+            last_time = now
+
+            # The collision checks inside are subtracted from this (see FrameProfiler)
+            game.profiler.start(constants.FramePhase.TETROMINO)
+            state = self._get_tetromino_state()
+            for _ in range(num_steps):
+                game._update_all_models(constants.SIMULATION_STEP, game._get_step_inputs(self.inputs))
+                game.time_since_tapped += constants.SIMULATION_STEP
+                game.tick_count += 1
+                if game.is_game_over:
+                    break
+            game.profiler.stop(constants.FramePhase.TETROMINO)
+
+            # Most steps only add to the fall timer; the display only changes when the piece moves or lands
+            if num_steps and self._get_tetromino_state() != state:
+                self.models_changed.set()
+            self.busy_time += game.clock.monotonic() - now
+
+            await asyncio.sleep(rate.time_until_next_step())
+
+        self._stop()
+
+    async def _sand_task(self):
+        """
+        Runs the sand physics at the governor's rate and budget, and the line clears. A step that runs out of
+        budget yields right away and carries on as soon as the other tasks have had their turn.
+        """
+        game = self.game
+        sand_pile = game.sand_pile
+        rate = game.scheduler.sand
+        last_time = game.clock.monotonic()
+
+        while self._is_running():
+            now = game.clock.monotonic()
+            elapsed = now - last_time
+            last_time = now
+
+            game.profiler.start(constants.FramePhase.SAND)
+            num_sand_steps = rate.advance(elapsed)
+            if num_sand_steps == 0 and sand_pile.has_unfinished_step():
+                num_sand_steps = 1
+            num_moved = 0
+            for _ in range(num_sand_steps):
+                num_moved += sand_pile.apply_sand_physics(max_seconds=game.governor.sand_time_budget)
+                if sand_pile.has_unfinished_step():
+                    break
+
+            # The same line clears as Game.start_game_loop
+            if game.line_clear.is_running():
+                game.score += game.line_clear.update(elapsed)
+                self.models_changed.set()
+            elif num_sand_steps:
+                grains = sand_pile.find_lines()
+                if grains:
+                    game.line_clear.start(grains)
+                    self.models_changed.set()
+            game.profiler.stop(constants.FramePhase.SAND)
+
+            # Settled sand still takes steps; only moving grains change the display
+            if num_moved:
+                self.models_changed.set()
+            self.busy_time += game.clock.monotonic() - now
+
+            if sand_pile.has_unfinished_step():
+                await asyncio.sleep(0)
+            else:
+                await asyncio.sleep(rate.time_until_next_step())
+
+    async def _render_task(self):
+        """ Renders at most RENDER_RATE times per second, and only after a model changed. """
+        game = self.game
+        rate = game.scheduler.render
+        last_time = game.clock.monotonic()
+
+        while self._is_running():
+            await self.models_changed.wait()
+            self.models_changed.clear()
+            if not self._is_running():
+                break
+
+            now = game.clock.monotonic()
+            game.profiler.start(constants.FramePhase.VIEWS)
+            game._update_all_views()
+            game.profiler.stop(constants.FramePhase.VIEWS)
+            end = game.clock.monotonic()
+            self.busy_time += end - now
+
+            # The render closes the profiler frame that the tasks have been adding to since the last one
+            if game.profiler.end_frame(end, self.busy_time):
+                game._report_profile()
+            game.profiler.begin_frame()
+
+            # The load of the whole game since the last render
+            game.governor.record_frame(self.busy_time, now - last_time)
+            self.busy_time = 0.0
+            last_time = now
+
+            await asyncio.sleep(rate.step)
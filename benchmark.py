@@ -0,0 +1,487 @@
+# benchmark.py
+# The sand physics benchmark suite. main() runs a fixed set of scenarios (see SCENARIOS) on every engine and
+# grid backend, and prints the results as JSON, so that runs can be saved and diffed across engines and commits.
+# report() prints the older human-readable comparisons of the backends and engines.
+# Run it on the board from the REPL with `import benchmark; benchmark.main()`, or on a desktop with
+# `python benchmark.py` (or `python benchmark.py report`).
+# Backends that cannot be created on the current platform (e.g. NumPy on the board) are skipped.
+# On a desktop, the bitmap backend runs on the headless_displayio Bitmap stand-in.
+
+import gc
+import json
+import sys
+import time
+
+from headless import HeadlessGraphicsManager
+from random_pool import RandomBitPool
+from sand_pile import SandPile
+from tetromino import Tetromino
+import constants
+
+try:
+    import displayio
+except ImportError:
+    import headless_displayio as displayio  # the pure-Python Bitmap stand-in on a desktop
+
+try:
+    import tracemalloc  # desktop only; on the board gc.mem_alloc() is used instead
+except ImportError:
+    tracemalloc = None
+
+NUM_PALETTE_COLORS = 10  # the number of colors in spritesheet.bmp
+BENCHMARK_SEED = 1234
+POUR_WIDTH = 12  # width (px) of the block of sand that is dropped onto the board
+POUR_HEIGHT = 12  # height (px) of the block of sand that is dropped onto the board
+NUM_POURS = 6
+MAX_STEPS_PER_POUR = 400
+
+# --- Scenario Settings ---
+MAX_SETTLE_STEPS = 2000  # a scenario that has not settled by then is reported with "settled": false
+NUM_AVALANCHE_PIECES = 20
+AVALANCHE_PIECE_INTERVAL = 10  # physics steps between two pieces of the avalanche
+SETTLED_BOARD_FILL = 0.8  # the fraction of the playfield rows that are full in the settled board scenario
+LINE_CLEAR_PILE_ROWS = 36  # the full rows that the line clear scenario starts with
+LINE_CLEAR_ROWS = 6  # the rows that are cleared from the middle of that pile
+
+
+def _now():
+    """ Returns the current time in seconds, using the most precise clock the platform has. """
+    if hasattr(time, "monotonic_ns"):
+        return time.monotonic_ns() / 1e9
+    return time.monotonic()
+
+
+def _pour(sand_pile: SandPile, left_x: int, value: int):
+    """ Stamps a POUR_WIDTH x POUR_HEIGHT block of sand at the top of the playfield and activates it. """
+    for y in range(POUR_HEIGHT):
+        for x in range(left_x, left_x + POUR_WIDTH):
+            sand_pile.add_grain((x, y), value)
+
+
+def run_workload(sand_pile: SandPile):
+    """
+    Drops NUM_POURS blocks of sand at different columns, stepping the physics until each one settles.
+
+    Returns:
+        tuple: (steps, seconds) spent inside apply_sand_physics.
+    """
+    steps = 0
+    elapsed = 0.0
+
+    for pour in range(NUM_POURS):
+        left_x = (pour * 7) % (constants.GAME_WIDTH - POUR_WIDTH)
+        _pour(sand_pile, left_x, 1 + pour % (NUM_PALETTE_COLORS - 1))
+
+        for _ in range(MAX_STEPS_PER_POUR):
+            if not sand_pile.has_active_pixels():
+                break
+
+            start = _now()
+            sand_pile.apply_sand_physics()
+            elapsed += _now() - start
+            steps += 1
+
+    return steps, elapsed
+
+
+def _measure_allocated_bytes(function):
+    """
+    Calls function() and returns how many bytes of heap it allocated.
+    On a desktop this is the tracemalloc peak; on the board the garbage collector is paused so that
+    gc.mem_alloc() counts every allocation, including short-lived ones.
+    """
+    gc.collect()
+
+    if tracemalloc is not None:
+        tracemalloc.start()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak
+
+    gc.disable()
+    try:
+        before = gc.mem_alloc()
+        function()
+        return gc.mem_alloc() - before
+    finally:
+        gc.enable()
+
+
+def measure_active_set_memory():
+    """
+    Prints the heap used by the active pixel set when a whole pour is active, and the heap allocated
+    by the physics steps that settle it (the churn the garbage collector has to clean up).
+    """
+    sand_pile = _make_sand_pile(constants.GridBackend.BYTEARRAY)
+
+    activation_bytes = _measure_allocated_bytes(lambda: _pour(sand_pile, 0, 1))
+
+    def settle():
+        for _ in range(MAX_STEPS_PER_POUR):
+            if not sand_pile.has_active_pixels():
+                break
+            sand_pile.apply_sand_physics()
+
+    settle_bytes = _measure_allocated_bytes(settle)
+
+    print("active set: {} bytes to activate {} grains, {} bytes allocated while settling".format(
+        activation_bytes, POUR_WIDTH * POUR_HEIGHT, settle_bytes,
+    ))
+
+
+def _make_sand_pile(backend: int, engine: int = constants.SandEngine.REFERENCE):
+    """
+    Creates an empty SandPile on the given backend, or returns None if it is unavailable here.
+    Every SandPile gets a RandomBitPool seeded with BENCHMARK_SEED, so all runs see the same random bits.
+    """
+    bitmap = None
+    if backend in (constants.GridBackend.BITMAP, constants.GridBackend.SHADOW):
+        bitmap = displayio.Bitmap(constants.GAME_WIDTH, constants.PLAYFIELD_HEIGHT, NUM_PALETTE_COLORS)
+
+    try:
+        return SandPile(bitmap, backend=backend, engine=engine, random_bits=RandomBitPool(BENCHMARK_SEED))
+    except ImportError:
+        return None
+
+
+def settled_statistics(sand_pile: SandPile):
+    """
+    Summarizes the settled pile.
+
+    Returns:
+        dict: The grain count and the mean, max and standard deviation of the column heights (in px).
+    """
+    grid = sand_pile.grid
+    grains = 0
+    heights = []
+
+    for x in range(constants.GAME_WIDTH):
+        height = 0
+        for y in range(constants.PLAYFIELD_HEIGHT):
+            if grid.get(x, y) != 0:
+                grains += 1
+                if height == 0:
+                    height = constants.PLAYFIELD_HEIGHT - y
+        heights.append(height)
+
+    mean = sum(heights) / len(heights)
+    variance = sum((height - mean) ** 2 for height in heights) / len(heights)
+
+    return {
+        "grains": grains,
+        "mean_height": mean,
+        "max_height": max(heights),
+        "height_stddev": variance ** 0.5,
+    }
+
+
+def compare_engines():
+    """
+    Runs the same workload on the reference engine and on each alternative engine, and prints the
+    settled statistics side by side. The grain count must match exactly; the heights should be close.
+    """
+    engines = (
+        ("reference", constants.GridBackend.BYTEARRAY, constants.SandEngine.REFERENCE),
+        ("numpy", constants.GridBackend.NUMPY, constants.SandEngine.NUMPY),
+        ("margolus", constants.GridBackend.BYTEARRAY, constants.SandEngine.MARGOLUS),
+    )
+
+    reference_grains = None
+
+    for name, backend, engine in engines:
+        sand_pile = _make_sand_pile(backend, engine)
+        if sand_pile is None:
+            print("{:>10}: unavailable".format(name))
+            continue
+
+        steps, elapsed = run_workload(sand_pile)
+        stats = settled_statistics(sand_pile)
+        if reference_grains is None:
+            reference_grains = stats["grains"]
+
+        print("{:>10}: {} steps in {:.3f} s, {} grains{}, height mean {:.2f} max {} stddev {:.2f}".format(
+            name, steps, elapsed, stats["grains"],
+            "" if stats["grains"] == reference_grains else " (MISMATCH)",
+            stats["mean_height"], stats["max_height"], stats["height_stddev"],
+        ))
+
+
+# --- Scenario Suite ---
+
+class ScenarioRun:
+    """
+    Drives one scenario and collects its measurements. Pieces are placed with place_piece() and physics
+    steps are run with step() or settle(); everything else a scenario does (setting up the board) is not measured.
+
+    With measure_allocations, every step is wrapped in _measure_allocated_bytes instead of being timed,
+    since tracing allocations slows the steps down. The suite runs each scenario once in each mode;
+    both runs are identical since the SandPile's random bits are seeded.
+    """
+
+    def __init__(self, sand_pile: SandPile, sprite_sheet_bitmap, measure_allocations: bool = False):
+        self.sand_pile = sand_pile
+        self.sprite_sheet_bitmap = sprite_sheet_bitmap
+        self.measure_allocations = measure_allocations
+
+        self.ticks = 0
+        self.seconds = 0.0
+        self.grains_moved = 0
+        self.peak_active_pixels = 0
+        self.allocated_bytes = 0
+        self.max_allocated_bytes = 0
+        self.pieces = 0
+        self.stamp_seconds = 0.0
+        self.settled = True
+
+    def place_piece(self, tetromino: Tetromino):
+        """ Turns the tetromino into sand where it is (the moment a piece lands in the game). """
+        start = _now()
+        self.sand_pile.transform_and_activate_tetromino_to_sand(tetromino, self.sprite_sheet_bitmap)
+        self.stamp_seconds += _now() - start
+        self.pieces += 1
+        self._update_peak_active_pixels()
+
+    def step(self):
+        """ Runs one physics step (one tick of apply_sand_physics). """
+        sand_pile = self.sand_pile
+
+        if self.measure_allocations:
+            allocated_bytes = _measure_allocated_bytes(sand_pile.apply_sand_physics)
+            self.allocated_bytes += allocated_bytes
+            self.max_allocated_bytes = max(self.max_allocated_bytes, allocated_bytes)
+        else:
+            start = _now()
+            self.grains_moved += sand_pile.apply_sand_physics()
+            self.seconds += _now() - start
+
+        self.ticks += 1
+        self._update_peak_active_pixels()
+
+    def settle(self, max_steps: int = MAX_SETTLE_STEPS):
+        """ Steps until the pile is settled (no active pixels left), or gives up after max_steps. """
+        for _ in range(max_steps):
+            if not self.sand_pile.has_active_pixels():
+                return
+            self.step()
+        self.settled = not self.sand_pile.has_active_pixels()
+
+    def _update_peak_active_pixels(self):
+        self.peak_active_pixels = max(self.peak_active_pixels, self.sand_pile.get_active_pixel_count())
+
+
+def _fill_rows(sand_pile: SandPile, first_y: int, last_y: int, pattern=None):
+    """
+    Fills rows [first_y, last_y) with grains of every color. pattern(x, y) can leave out pixels.
+    Every grain is activated, like sand that was just placed.
+    """
+    for y in range(first_y, last_y):
+        for x in range(constants.GAME_WIDTH):
+            if pattern is None or pattern(x, y):
+                sand_pile.add_grain((x, y), 1 + (x + y) % (NUM_PALETTE_COLORS - 1))
+
+
+def _settle_untimed(sand_pile: SandPile):
+    """ Settles the pile as part of a scenario's setup. """
+    for _ in range(MAX_SETTLE_STEPS):
+        if not sand_pile.has_active_pixels():
+            return
+        sand_pile.apply_sand_physics()
+
+
+def _landed_tetromino(sand_pile: SandPile, shape_type: int, color_type: int, x: int) -> Tetromino:
+    """
+    Returns a tetromino dropped straight down at column x until it rests on the sand or the floor,
+    using the same collision rules as Game._is_tetromino_collision.
+    """
+    tetromino = Tetromino(shape_type, color_type, start_x=x)
+    tetromino.y = constants.INFO_BAR_HEIGHT - tetromino.get_top_padding()
+
+    shape_total_height = constants.TETROMINO_SHAPE_DATA_SIZE * constants.MINO_SIZE
+    pixel_masks = tetromino.get_pixel_masks()
+
+    while True:
+        next_y = tetromino.y + 1
+        if next_y + (shape_total_height - 1) - tetromino.get_bottom_padding() >= constants.GAME_HEIGHT:
+            return tetromino
+        if sand_pile.overlaps_pixel_masks(pixel_masks, x, next_y - constants.INFO_BAR_HEIGHT):
+            return tetromino
+        tetromino.y = next_y
+
+
+def scenario_single_piece(run: ScenarioRun):
+    """ One T piece lands on an empty board and crumbles into a pile. """
+    sand_pile = run.sand_pile
+    x = (constants.GAME_WIDTH - constants.TETROMINO_SHAPE_DATA_SIZE * constants.MINO_SIZE) // 2
+    run.place_piece(_landed_tetromino(sand_pile, constants.ShapeType.T, constants.ColorType.BLUE, x))
+    run.settle()
+
+
+def scenario_avalanche(run: ScenarioRun):
+    """ NUM_AVALANCHE_PIECES pieces land one after another, each before the previous ones have settled. """
+    sand_pile = run.sand_pile
+    max_x = constants.GAME_WIDTH - constants.TETROMINO_SHAPE_DATA_SIZE * constants.MINO_SIZE
+
+    for piece in range(NUM_AVALANCHE_PIECES):
+        tetromino = _landed_tetromino(
+            sand_pile,
+            piece % len(constants.SHAPE_TYPE_POPULATION),
+            piece % (constants.ColorType.WHITE + 1),
+            (piece * 7) % (max_x + 1),
+        )
+        run.place_piece(tetromino)
+        for _ in range(AVALANCHE_PIECE_INTERVAL):
+            run.step()
+
+    run.settle()
+
+
+def scenario_settled_board(run: ScenarioRun):
+    """
+    The bottom SETTLED_BOARD_FILL of the playfield is full and every grain is active, as if it had all just
+    landed. Nothing can move, so this measures how quickly an engine finds out that the pile is settled.
+    """
+    full_rows = int(constants.PLAYFIELD_HEIGHT * SETTLED_BOARD_FILL)
+    _fill_rows(run.sand_pile, constants.PLAYFIELD_HEIGHT - full_rows, constants.PLAYFIELD_HEIGHT)
+    run.settle()
+
+
+def scenario_checkerboard(run: ScenarioRun):
+    """ The worst case: every other pixel of the playfield has a grain, so every grain is floating. """
+    _fill_rows(run.sand_pile, 0, constants.PLAYFIELD_HEIGHT, lambda x, y: (x + y) % 2 == 0)
+    run.settle()
+
+
+def scenario_line_clear(run: ScenarioRun):
+    """ LINE_CLEAR_ROWS rows are cleared from the middle of a settled pile, and the rows above collapse. """
+    sand_pile = run.sand_pile
+    pile_top = constants.PLAYFIELD_HEIGHT - LINE_CLEAR_PILE_ROWS
+    _fill_rows(sand_pile, pile_top, constants.PLAYFIELD_HEIGHT)
+    _settle_untimed(sand_pile)
+
+    first_cleared_y = pile_top + (LINE_CLEAR_PILE_ROWS - LINE_CLEAR_ROWS) // 2
+    for y in range(first_cleared_y, first_cleared_y + LINE_CLEAR_ROWS):
+        for x in range(constants.GAME_WIDTH):
+            sand_pile.remove_grain((x, y))
+
+    run.settle()
+
+
+SCENARIOS = (
+    ("single_piece", scenario_single_piece),
+    ("avalanche", scenario_avalanche),
+    ("settled_board", scenario_settled_board),
+    ("checkerboard", scenario_checkerboard),
+    ("line_clear", scenario_line_clear),
+)
+
+# (engine name, backend name, grid backend, sand engine)
+SUITE_CONFIGS = (
+    ("reference", "bitmap", constants.GridBackend.BITMAP, constants.SandEngine.REFERENCE),
+    ("reference", "bytearray", constants.GridBackend.BYTEARRAY, constants.SandEngine.REFERENCE),
+    ("numpy", "numpy", constants.GridBackend.NUMPY, constants.SandEngine.NUMPY),
+    ("margolus", "bytearray", constants.GridBackend.BYTEARRAY, constants.SandEngine.MARGOLUS),
+)
+
+
+def _per_second(count, seconds: float) -> float:
+    return round(count / seconds, 1) if seconds > 0 else 0.0
+
+
+def run_scenario(scenario, backend: int, engine: int, sprite_sheet_bitmap):
+    """
+    Runs one scenario twice (timed, then with allocation tracing) on a fresh SandPile.
+
+    Returns:
+        dict: The scenario's measurements, or None if the backend is unavailable here.
+    """
+    sand_pile = _make_sand_pile(backend, engine)
+    if sand_pile is None:
+        return None
+    timed_run = ScenarioRun(sand_pile, sprite_sheet_bitmap)
+    scenario(timed_run)
+
+    allocation_run = ScenarioRun(_make_sand_pile(backend, engine), sprite_sheet_bitmap, measure_allocations=True)
+    scenario(allocation_run)
+
+    return {
+        "ticks": timed_run.ticks,
+        "seconds": round(timed_run.seconds, 6),
+        "ticks_per_second": _per_second(timed_run.ticks, timed_run.seconds),
+        "grains_moved": timed_run.grains_moved,
+        "grains_moved_per_second": _per_second(timed_run.grains_moved, timed_run.seconds),
+        "peak_active_pixels": timed_run.peak_active_pixels,
+        "allocated_bytes_per_tick": round(allocation_run.allocated_bytes / allocation_run.ticks, 1) if allocation_run.ticks else 0.0,
+        "max_allocated_bytes_per_tick": allocation_run.max_allocated_bytes,
+        "pieces": timed_run.pieces,
+        "stamp_seconds": round(timed_run.stamp_seconds, 6),
+        "grains": settled_statistics(sand_pile)["grains"],
+        "settled": timed_run.settled,
+    }
+
+
+def run_suite():
+    """
+    Runs every scenario on every engine and backend that is available here.
+
+    Returns:
+        dict: The results, ready for json.dumps.
+    """
+    sprite_sheet_bitmap = HeadlessGraphicsManager().sprite_sheet_bitmap
+    results = []
+
+    for engine_name, backend_name, backend, engine in SUITE_CONFIGS:
+        scenarios = {}
+        for scenario_name, scenario in SCENARIOS:
+            measurements = run_scenario(scenario, backend, engine, sprite_sheet_bitmap)
+            if measurements is None:
+                break  # the backend is unavailable on this platform
+            scenarios[scenario_name] = measurements
+
+        if scenarios:
+            results.append({"engine": engine_name, "backend": backend_name, "scenarios": scenarios})
+
+    return {
+        "platform": sys.platform,
+        "seed": BENCHMARK_SEED,
+        "runs": results,
+    }
+
+
+def main():
+    results = run_suite()
+    try:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    except TypeError:
+        print(json.dumps(results))  # CircuitPython's json has no formatting options
+
+
+def report():
+    backends = (
+        ("bitmap", constants.GridBackend.BITMAP),
+        ("bytearray", constants.GridBackend.BYTEARRAY),
+        ("numpy", constants.GridBackend.NUMPY),
+    )
+
+    for name, backend in backends:
+        sand_pile = _make_sand_pile(backend)
+        if sand_pile is None:
+            print("{:>10}: unavailable".format(name))
+            continue
+
+        steps, elapsed = run_workload(sand_pile)
+        per_step_ms = 1000 * elapsed / steps if steps else 0.0
+        print("{:>10}: {} steps in {:.3f} s ({:.3f} ms/step)".format(name, steps, elapsed, per_step_ms))
+
+    print()
+    compare_engines()
+
+    print()
+    measure_active_set_memory()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "report":
+        report()
+    else:
+        main()
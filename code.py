@@ -1,4 +1,13 @@
 from game import Game
+import constants
 
 game = Game()
-game.start_game_loop()
+
+if constants.ASYNC_GAME_LOOP:
+    import asyncio
+    from async_game_loop import AsyncGameLoop
+
+    asyncio.run(AsyncGameLoop(game).run())
+    game.show_game_over()
+else:
+    game.start_game_loop()
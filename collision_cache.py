@@ -0,0 +1,14 @@
+# collision_cache.py
+
+from lru_cache import LRUCache
+
+
+class CollisionCache(LRUCache):
+    """
+    A small least-recently-used cache of collision answers keyed by (shape, orientation, x, y, generation).
+
+    The generation is the SandPile's count of changes to the rows that the piece covers at (x, y) (see
+    SandPile.get_generation), so an answer is only reused while the sand it was computed against is the
+    same. Answers about sand that has changed since are never hit again, and simply age out.
+    """
+    pass
@@ -1,6 +1,8 @@
 # constants.py
 # This file holds all the static configuration values for the Sand Tetris game.
 
+from array import array
+
 # --- File location for Sprite Sheet ---
 SPRITE_FILE_LOCATION = "/spritesheet.bmp"
 
@@ -10,6 +12,9 @@ GAME_HEIGHT = 64
 INFO_BAR_HEIGHT = 5
 PLAYFIELD_HEIGHT = GAME_HEIGHT - INFO_BAR_HEIGHT
 
+# A row occupancy mask with a bit set for every column of the playfield (see SandPile.row_masks)
+FULL_ROW_MASK = (1 << GAME_WIDTH) - 1
+
 # --- Timing ---
 TPS = 20  # The amount of ticks that run in a single second
 # If the TPS is too fast, the controller will not respect it and run as
@@ -21,6 +26,25 @@ MATRIX_PORTAL_LIS3DH_ADDRESS = 0x19
 TAP_THRESHOLD = 100
 SHAKE_THRESHOLD = 25
 TAP_COOLDOWN = 0.1  # the time in seconds before another tap (rotate) can occur
+SHAKE_HARD_DROPS = True  # a shake drops the active tetromino straight to where it lands
+
+# --- Frame Profiler ---
+
+class FramePhase:
+    """Namespace for the parts of a frame that the FrameProfiler times. The values are the direct indices."""
+    INPUTS = 0     # InputsManager.get_all_inputs
+    COLLISION = 1  # the collision and wall checks
+    TETROMINO = 2  # the rest of _update_all_models: moving, rotating and landing the tetromino
+    SAND = 3       # SandPile.apply_sand_physics
+    VIEWS = 4      # _update_all_views, without the refresh
+    REFRESH = 5    # GraphicsManager.end_frame: pushing the frame to the display
+    FRAME = 6      # the whole frame, without the sleep
+
+NUM_FRAME_PHASES = 7
+FRAME_PHASE_NAMES = ("inputs", "collision", "tetromino", "sand", "views", "refresh", "frame")
+
+PROFILER_NUM_SAMPLES = 128  # the number of frames kept in the profiler's ring buffer (6.4 s at 20 TPS)
+PROFILER_REPORT_INTERVAL = 5.0  # the time in seconds between two profiler summaries; None turns them off
 
 # --- Sand Physics ---
 
@@ -30,6 +54,107 @@ TAP_COOLDOWN = 0.1  # the time in seconds before another tap (rotate) can occur
 # This number must be an integer.
 SLOW_MULTIPLIER = 3
 
+# The time in seconds one call to apply_sand_physics may take in the game loop. A step that runs out
+# resumes on the next frame (see SandPile.apply_sand_physics), so a big avalanche cannot overrun the frame.
+SAND_PHYSICS_TIME_BUDGET = TICK_RATE / 2
+
+# --- Scheduler ---
+# code.py runs the game on the asyncio tasks of async_game_loop.py instead of Game.start_game_loop
+ASYNC_GAME_LOOP = False
+
+# How many times per second each part of the game runs (see scheduler.py). The simulation runs in fixed
+# steps of SIMULATION_STEP seconds, so the tetromino's gravity does not depend on how long a frame took.
+SIMULATION_RATE = TPS
+SIMULATION_STEP = 1.0 / SIMULATION_RATE
+INPUT_RATE = TPS
+SAND_PHYSICS_RATE = TPS / SLOW_MULTIPLIER
+RENDER_RATE = TPS
+
+# The display is refreshed explicitly, only after a render that changed something (see GraphicsManager.end_frame).
+# It is refreshed at most DISPLAY_TARGET_FPS times per second: a refresh that comes sooner than that after the
+# last one is deferred to the next render, never waited for. Renders are scheduled at RENDER_RATE with some
+# jitter, so a refresh may come up to DISPLAY_REFRESH_SLACK of a frame early before it is deferred.
+DISPLAY_TARGET_FPS = RENDER_RATE
+DISPLAY_REFRESH_SLACK = 0.25
+
+# After an overrun, the simulation runs at most this many steps in one frame to catch up; older lag is dropped.
+MAX_SIMULATION_CATCH_UP_STEPS = 3
+# The sand does not catch up, so a spike in sand load slows down the sand, never the falling tetromino.
+MAX_SAND_CATCH_UP_STEPS = 1
+# While the simulation catches up, rendering is skipped, but never for more than this many frames in a row.
+MAX_SKIPPED_RENDERS = 2
+
+# --- Sand Quality Governor ---
+# The quality levels the SandQualityGovernor (see sand_quality_governor.py) moves between, from full quality down.
+# Each level is (sand physics steps per second, time budget in seconds per apply_sand_physics call).
+SAND_QUALITY_LEVELS = (
+    (SAND_PHYSICS_RATE, SAND_PHYSICS_TIME_BUDGET),
+    (SAND_PHYSICS_RATE * 3 / 4, SAND_PHYSICS_TIME_BUDGET * 3 / 4),
+    (SAND_PHYSICS_RATE / 2, SAND_PHYSICS_TIME_BUDGET / 2),
+    (SAND_PHYSICS_RATE / 3, SAND_PHYSICS_TIME_BUDGET / 3),
+)
+GOVERNOR_WINDOW_FRAMES = 20  # the governor decides once per this many frames (about a second)
+GOVERNOR_HIGH_LOAD = 0.8  # above this share of time spent working (not sleeping), quality goes down a level
+GOVERNOR_LOW_LOAD = 0.5  # below it, the window counts as calm
+GOVERNOR_RESTORE_WINDOWS = 3  # calm windows in a row before quality goes back up a level
+
+# --- Sand Grid Storage ---
+
+class GridBackend:
+    """Namespace for the storage backends the SandPile can simulate on. See sand_grid.py."""
+    BITMAP = 0     # the SandPileView bitmap itself (what gets drawn)
+    BYTEARRAY = 1  # a flat bytearray of GAME_WIDTH * PLAYFIELD_HEIGHT bytes
+    NUMPY = 2      # a flat NumPy uint8 array, for desktop runs
+    SHADOW = 3     # a flat bytearray whose changed rows are copied to the bitmap once per render
+
+SAND_GRID_BACKEND = GridBackend.BITMAP
+
+class SandEngine:
+    """Namespace for the sand physics engines a SandPile can be built with."""
+    REFERENCE = 0  # SandPile.apply_sand_physics: per-pixel, driven by the active pixel set
+    NUMPY = 1      # numpy_sand_engine.py: whole row sets at once, needs GridBackend.NUMPY (desktop only)
+    MARGOLUS = 2   # margolus_sand_engine.py: 2x2 block cellular automaton driven by a lookup table
+
+SAND_ENGINE = SandEngine.REFERENCE
+
+# --- Randomness ---
+
+# The seed for the RandomBitPool that drives the sand and the piece sequence (see random_pool.py).
+# None keeps the board's own random seed; any integer makes every run identical (benchmarks, replays).
+RANDOM_SEED = None
+
+# The number of random bytes the RandomBitPool generates per refill
+RANDOM_POOL_SIZE = 64
+
+# --- Sand Sleeping Tiles ---
+
+# The playfield is split into fixed SAND_TILE_SIZE x SAND_TILE_SIZE tiles that are either awake or asleep.
+# A tile falls asleep after SAND_TILE_SLEEP_STEPS physics steps without any active sand and wakes up as soon
+# as sand in it is activated. The grains of a sleeping tile count as settled once the tiles beside and under it
+# are asleep too (see SandPile._register_settled_tiles).
+SAND_TILE_SHIFT = 3
+SAND_TILE_SIZE = 1 << SAND_TILE_SHIFT  # 8 px. GAME_WIDTH must be a multiple of it.
+SAND_TILE_COLUMNS = GAME_WIDTH // SAND_TILE_SIZE  # 4
+SAND_TILE_ROWS = (PLAYFIELD_HEIGHT + SAND_TILE_SIZE - 1) // SAND_TILE_SIZE  # 8 (the last one is 3 px tall)
+SAND_TILE_SLEEP_STEPS = 4
+
+# --- Line Clear Animation ---
+
+# The sand palette is the sprite sheet palette (10 colors) plus one more entry, used to flash the grains
+# that are being cleared. Marking them with it once lets the flash be a palette swap (see line_clear.py).
+SAND_FLASH_INDEX = 10
+SAND_FLASH_COLOR = 0xFFFFFF
+
+class ClearPhase:
+    """Namespace for the phases of the line clear animation."""
+    IDLE = 0
+    FLASHING = 1  # the path blinks between SAND_FLASH_COLOR and its own color
+    ERASING = 2   # the path is erased a few grains per frame
+
+CLEAR_FLASH_DURATION = 0.6  # seconds
+CLEAR_FLASH_INTERVAL = 0.1  # seconds between two palette swaps while flashing
+CLEAR_ERASE_GRAINS_PER_FRAME = 64  # the most grains erased in one frame
+
 # --- Tetromino Physics ---
 INITIAL_FALL_RATE = 0.12 # the seconds it takes for the tetromino to fall 1 px. Default: 0.12
 FALL_RATE_DECREMENTATION_RATE = 0.01  # removes this value from the fall_rate when Tetromino calls decrement_fall_rate()
@@ -50,6 +175,14 @@ TETROMINO_SHAPE_DATA_SIZE = 4
 # This means for each mino, it is going to be 3 px by 3 px
 MINO_SIZE = 3
 
+# The number of pre-rendered piece stamps (one per shape, orientation and color) that the SandPile keeps
+# for placing landed pieces. Each one is at most 12 * 12 = 144 bytes plus bookkeeping.
+STAMP_CACHE_SIZE = 8
+
+# The number of collision answers the Game remembers (see collision_cache.py). A piece that waits for its
+# gravity step, and a rotation that tries its kicks, ask about the same few positions over and over.
+COLLISION_CACHE_SIZE = 16
+
 # --- Tetromino Starting Location ---
 TETROMINO_START_X = 13  # where the tetromino starts
 
@@ -58,6 +191,19 @@ MAX_SHIFTS = 6
 # the maximum shifts/wall kick positions it will move until it
 # it gives up trying to find a valid position
 
+class KickOrder:
+    """Namespace for the wall kick orders a rotation can try (see wall_kicks.py)."""
+    CLASSIC = 0  # no kick unless the rotated piece pokes through a wall and misses the sand; then 1 px left, 1 px right, 2 px left, ...
+    SRS = 1      # the Super Rotation System kicks (in minos, including the vertical ones); the CLASSIC shifts only if none of them is inside the walls
+
+KICK_ORDER = KickOrder.CLASSIC
+
+# --- Ghost Piece ---
+# The outline of where the active tetromino would land, drawn with the sprite sheet colors dimmed by
+# GHOST_DIM_SHIFT (each RGB channel is shifted right by it).
+SHOW_GHOST_PIECE = True
+GHOST_DIM_SHIFT = 2
+
 # --- Colors ---
 NUM_SPRITES_PER_COLOR = 15
 
@@ -319,3 +465,82 @@ SHAPES = {
     ShapeType.Z: [Z_SHAPE_DATA_UP, Z_SHAPE_DATA_RIGHT, Z_SHAPE_DATA_DOWN, Z_SHAPE_DATA_LEFT],
 }
 
+
+# --- Precomputed Shape Geometry ---
+
+class ShapeGeometry:
+    """
+    Everything about one (shape, orientation) that can be derived from its 4x4 shape data.
+    These are built once at import so that the Tetromino never has to rescan its shape data.
+
+    Attributes:
+        left_padding, right_padding, top_padding, bottom_padding (int): The empty space (in px)
+            between the 12x12 px shape area and the occupied minos.
+        minos (tuple): (mino_x, mino_y, sprite_column) for every occupied mino, in shape data order.
+        bounding_box (tuple): (x, y, width, height) in px of the occupied area, relative to the piece.
+        pixel_masks (array): 12 pixel row masks (TETROMINO_SHAPE_DATA_SIZE * MINO_SIZE rows).
+            Bit i of a row mask is set when pixel column i of the piece is occupied. Shifting a row
+            mask left by the piece's x lines it up with SandPile.row_masks, so collision is one
+            shift-and-AND per pixel row.
+        bottom_profile (bytes): For each of the 12 pixel columns, 1 + the row of its lowest occupied pixel,
+            or 0 for an empty column. With the sand's column heights it gives the landing position in
+            one pass (see SandPile.find_landing_y).
+    """
+
+    def __init__(self, shape_data: bytes):
+        size = TETROMINO_SHAPE_DATA_SIZE
+        shape_pixels = size * MINO_SIZE
+        mino_mask = (1 << MINO_SIZE) - 1  # one mino is MINO_SIZE pixels wide
+
+        minos = []
+        pixel_masks = array("H", [0] * shape_pixels)
+
+        for index, mino_value in enumerate(shape_data):
+            if mino_value == 0:
+                continue
+
+            mino_x = index % size
+            mino_y = index // size
+            minos.append((mino_x, mino_y, mino_value))
+
+            for y_offset in range(MINO_SIZE):
+                pixel_masks[mino_y * MINO_SIZE + y_offset] |= mino_mask << (mino_x * MINO_SIZE)
+
+        columns = [mino[0] for mino in minos]
+        rows = [mino[1] for mino in minos]
+
+        self.left_padding = min(columns) * MINO_SIZE
+        self.right_padding = (size - 1 - max(columns)) * MINO_SIZE
+        self.top_padding = min(rows) * MINO_SIZE
+        self.bottom_padding = (size - 1 - max(rows)) * MINO_SIZE
+
+        self.minos = tuple(minos)
+        self.bounding_box = (
+            self.left_padding,
+            self.top_padding,
+            shape_pixels - self.left_padding - self.right_padding,
+            shape_pixels - self.top_padding - self.bottom_padding,
+        )
+        self.pixel_masks = pixel_masks
+
+        bottom_profile = bytearray(shape_pixels)
+        for pixel_row in range(shape_pixels):
+            for pixel_column in range(shape_pixels):
+                if (pixel_masks[pixel_row] >> pixel_column) & 1:
+                    bottom_profile[pixel_column] = pixel_row + 1
+        self.bottom_profile = bytes(bottom_profile)
+
+# Indexed the same way as SHAPES: SHAPE_GEOMETRY[shape_type][orientation].
+# The O piece's four orientations share one ShapeGeometry, like they share one bytes object.
+_geometry_by_shape_data = {}
+for _orientations in SHAPES.values():
+    for _shape_data in _orientations:
+        if _shape_data not in _geometry_by_shape_data:
+            _geometry_by_shape_data[_shape_data] = ShapeGeometry(_shape_data)
+
+SHAPE_GEOMETRY = {
+    shape_type: [_geometry_by_shape_data[shape_data] for shape_data in orientations]
+    for shape_type, orientations in SHAPES.items()
+}
+
+del _geometry_by_shape_data, _orientations, _shape_data
@@ -0,0 +1,172 @@
+# frame_profiler.py
+
+from array import array
+import time
+
+import constants
+
+try:
+    from supervisor import ticks_ms  # CircuitPython: a small int, so reading the timer never allocates
+except ImportError:
+    ticks_ms = None
+
+# supervisor.ticks_ms() wraps around at 2**29
+_TICKS_PERIOD = 1 << 29
+
+if ticks_ms is not None:
+    _ticks = ticks_ms
+
+    def _ticks_diff_us(end: int, start: int) -> int:
+        return ((end - start) & (_TICKS_PERIOD - 1)) * 1000
+else:
+    _ticks = time.perf_counter_ns
+
+    def _ticks_diff_us(end: int, start: int) -> int:
+        return (end - start) // 1000
+
+
+class FrameProfiler:
+    """
+    Times the phases of every frame (see constants.FramePhase) and keeps the last PROFILER_NUM_SAMPLES
+    frames in a ring buffer. The buffer is a single array of microseconds allocated up front, so
+    recording a frame does not allocate anything.
+
+    Usage, once per frame:
+        profiler.begin_frame()
+        profiler.start(FramePhase.INPUTS)
+        ...
+        profiler.stop(FramePhase.INPUTS)
+        ...
+        if profiler.end_frame(now):
+            profiler.report()
+
+    Phases may be nested and started several times per frame; their times add up. TETROMINO is timed around
+    the simulation steps, and the COLLISION time spent inside them is subtracted in end_frame; the same goes
+    for VIEWS and the REFRESH inside it.
+
+    On the board the timer is supervisor.ticks_ms(), so each sample is a whole number of milliseconds.
+    A phase shorter than a millisecond reads as 0 or 1 ms depending on where the tick falls, which
+    averages out to its true duration in the mean.
+    """
+
+    def __init__(self, num_samples: int = constants.PROFILER_NUM_SAMPLES, report_interval: float = constants.PROFILER_REPORT_INTERVAL):
+        """
+        Args:
+            num_samples (int): The number of frames kept in the ring buffer.
+            report_interval (float): The time in seconds between two summaries; None turns them off.
+        """
+        self.num_samples = num_samples
+        self.report_interval = report_interval
+
+        # num_samples rows of NUM_FRAME_PHASES durations (in microseconds)
+        self._samples = array("L", [0] * (num_samples * constants.NUM_FRAME_PHASES))
+        self._next_row = 0
+        self._num_filled = 0
+
+        # The current frame
+        self._frame_start = 0
+        self._phase_starts = [0] * constants.NUM_FRAME_PHASES
+        self._durations = array("L", [0] * constants.NUM_FRAME_PHASES)
+
+        self.num_frames = 0
+        self.num_overruns = 0  # frames that took longer than TICK_RATE since the last report
+        self._tick_rate_us = int(constants.TICK_RATE * 1000000)
+        self._next_report_time = None
+
+    def begin_frame(self):
+        durations = self._durations
+        for phase in range(constants.NUM_FRAME_PHASES):
+            durations[phase] = 0
+        self._frame_start = _ticks()
+
+    def start(self, phase: int):
+        self._phase_starts[phase] = _ticks()
+
+    def stop(self, phase: int):
+        self._durations[phase] += _ticks_diff_us(_ticks(), self._phase_starts[phase])
+
+    def end_frame(self, now: float, frame_time: float = None) -> bool:
+        """
+        Records the frame into the ring buffer.
+
+        Args:
+            now (float): The game clock's time, used to schedule the summaries.
+            frame_time (float): The time in seconds the frame spent working, for a frame whose work was not one
+                stretch from begin_frame to here (see async_game_loop.py). By default, the time since begin_frame.
+
+        Returns:
+            bool: Whether a summary is due (see report).
+        """
+        durations = self._durations
+        if frame_time is None:
+            durations[constants.FramePhase.FRAME] = _ticks_diff_us(_ticks(), self._frame_start)
+        else:
+            durations[constants.FramePhase.FRAME] = int(frame_time * 1000000)
+
+        # TETROMINO was timed around the whole model update, which includes COLLISION,
+        # and VIEWS around the whole render, which includes REFRESH
+        self._subtract_nested(constants.FramePhase.TETROMINO, constants.FramePhase.COLLISION)
+        self._subtract_nested(constants.FramePhase.VIEWS, constants.FramePhase.REFRESH)
+
+        if durations[constants.FramePhase.FRAME] > self._tick_rate_us:
+            self.num_overruns += 1
+
+        row_start = self._next_row * constants.NUM_FRAME_PHASES
+        for phase in range(constants.NUM_FRAME_PHASES):
+            self._samples[row_start + phase] = durations[phase]
+
+        self._next_row += 1
+        if self._next_row == self.num_samples:
+            self._next_row = 0
+        if self._num_filled < self.num_samples:
+            self._num_filled += 1
+        self.num_frames += 1
+
+        if self.report_interval is None:
+            return False
+        if self._next_report_time is None:
+            self._next_report_time = now + self.report_interval
+            return False
+        if now >= self._next_report_time:
+            self._next_report_time = now + self.report_interval
+            return True
+        return False
+
+    def _subtract_nested(self, outer: int, inner: int):
+        durations = self._durations
+        if durations[outer] > durations[inner]:
+            durations[outer] -= durations[inner]
+        else:
+            durations[outer] = 0
+
+    def summarize(self, phase: int):
+        """
+        Returns:
+            tuple: (min, mean, p95, max) of the phase over the frames in the ring buffer, in milliseconds.
+        """
+        if self._num_filled == 0:
+            return 0.0, 0.0, 0.0, 0.0
+
+        values = sorted(
+            self._samples[row * constants.NUM_FRAME_PHASES + phase] for row in range(self._num_filled)
+        )
+        p95_index = min(len(values) - 1, (len(values) * 95) // 100)
+
+        return (
+            values[0] / 1000,
+            sum(values) / len(values) / 1000,
+            values[p95_index] / 1000,
+            values[-1] / 1000,
+        )
+
+    def report(self):
+        """ Prints a summary of every phase and the overruns since the last report, then resets the overrun count. """
+        print("Frame profile: {} frames, {} over {:.0f} ms since the last report".format(
+            self.num_frames, self.num_overruns, constants.TICK_RATE * 1000,
+        ))
+        for phase in range(constants.NUM_FRAME_PHASES):
+            low, mean, p95, high = self.summarize(phase)
+            print("  {:>9}: min {:6.2f}  mean {:6.2f}  p95 {:6.2f}  max {:6.2f} ms".format(
+                constants.FRAME_PHASE_NAMES[phase], low, mean, p95, high,
+            ))
+        self.num_overruns = 0
@@ -1,15 +1,19 @@
 # game.py
 
-from inputs_manager import InputsManager
-from graphics_manager import GraphicsManager
 from tetromino_view import TetrominoView
 from sand_pile_view import SandPileView
 from tetromino import Tetromino
 from sand_pile import SandPile
+from random_pool import RandomBitPool
+from frame_profiler import FrameProfiler
+from scheduler import Scheduler
+from sand_quality_governor import SandQualityGovernor
+from line_clear import LineClearAnimation
+from collision_cache import CollisionCache
+import wall_kicks
 import constants
 
 import time
-import random
 
 class Game:
     """
@@ -17,20 +21,40 @@ class Game:
     It authorizes decisions to the model.
     """
 
-    def __init__(self):
+    def __init__(self, inputs_manager=None, graphics_manager=None, clock=None, random_bits: RandomBitPool = None):
         """
         Creates the Game object.
         This constructor then creates a
             Graphics Manager,
             SandPile,
             and the Active Tetromino.
+
+        The input and display backends can be swapped out to run the game off the board (see headless.py).
+        By default, the hardware ones are created; they are only imported then, since their modules need
+        the board's libraries.
+
+        Args:
+            inputs_manager: Anything with a get_all_inputs() method. Defaults to the accelerometer's InputsManager.
+            graphics_manager: Anything with the GraphicsManager attributes and frame methods.
+                Defaults to the LED matrix's GraphicsManager.
+            clock: Anything with monotonic() and sleep() methods. Defaults to the time module.
+            random_bits (RandomBitPool): The source of every random decision. Defaults to a pool
+                seeded with constants.RANDOM_SEED.
         """
 
         # --- Create our InputsManager sub-controller class/object ---
-        self.inputs_manager = InputsManager()
+        if inputs_manager is None:
+            from inputs_manager import InputsManager
+            inputs_manager = InputsManager()
+        self.inputs_manager = inputs_manager
+
+        self.clock = clock if clock is not None else time
 
         # --- Create our view classes/objects ---
-        self.graphics_manager = GraphicsManager()
+        if graphics_manager is None:
+            from graphics_manager import GraphicsManager
+            graphics_manager = GraphicsManager()
+        self.graphics_manager = graphics_manager
 
         self.active_tetromino_view = TetrominoView(
             sprite_sheet_bitmap=self.graphics_manager.sprite_sheet_bitmap,
@@ -43,29 +67,49 @@ class Game:
         )
 
         # --- Create our models classes/objects ---
+        # Every random decision (pieces and sand) comes from one seeded pool, see constants.RANDOM_SEED
+        self.random_bits = random_bits if random_bits is not None else RandomBitPool(constants.RANDOM_SEED)
+
         self.active_tetromino = Tetromino(self._get_random_shape(), self._get_random_color())
-        self.sand_pile = SandPile(self.sand_pile_view.sand_state_bitmap)
+        self.sand_pile = SandPile(self.sand_pile_view.sand_state_bitmap, random_bits=self.random_bits)
+        # Flashes and erases the cleared paths over several frames (see line_clear.py)
+        self.line_clear = LineClearAnimation(self.sand_pile, self.sand_pile_view)
 
         self.next_shape = self._get_random_shape()
         self.next_color = self._get_random_color()
 
         # -- Create variables related with the game-loop
-        self.last_frame_time = time.monotonic()
+        self.last_frame_time = self.clock.monotonic()
         self.is_game_over = False
         self.time_since_tapped = 0.0
 
         self.num_tetrominoes_dropped = 0
         self.tick_count = 0
+        self.score = 0  # one point per cleared grain
+
+        # Decides what runs each frame (see start_game_loop)
+        self.scheduler = Scheduler()
+        # Lowers the sand physics rate and budget when frames run long, and restores them when there is headroom
+        self.governor = SandQualityGovernor(self.scheduler.sand)
+        # Taps and shakes polled but not yet used by a simulation step (see _latch_inputs)
+        self._tap_latched = False
+        self._shake_latched = False
+
+        # Remembers collision answers until the sand they were computed against changes
+        self.collision_cache = CollisionCache(constants.COLLISION_CACHE_SIZE)
+
+        # Times the phases of every frame, and prints a summary every PROFILER_REPORT_INTERVAL seconds
+        self.profiler = FrameProfiler()
 
     # --- Methods ---
 
 
 
     def _get_random_shape(self):
-        return random.choice(constants.SHAPE_TYPE_POPULATION)
+        return self.random_bits.choice(constants.SHAPE_TYPE_POPULATION)
 
     def _get_random_color(self):
-        return random.choice(constants.COLOR_TYPE_POPULATION_WEIGHTED)
+        return self.random_bits.choice(constants.COLOR_TYPE_POPULATION_WEIGHTED)
 
     def _is_tetromino_collision(self, proposed_x: int, proposed_y: int):
         """
@@ -80,43 +124,40 @@ class Game:
             proposed_x (int): The proposed new x-coordinate for the active tetromino.
             proposed_y (int): The proposed new y-coordinate for the active tetromino.
         """
-
-        # Get the vertical space that is empty in the tetromino's shape
-        bottom_padding = self.active_tetromino.get_bottom_padding()
+        self.profiler.start(constants.FramePhase.COLLISION)
 
         # Calculate the total height of the tetromino shape in pixels
         shape_total_height = constants.TETROMINO_SHAPE_DATA_SIZE * constants.MINO_SIZE
-        bottom_edge_position = proposed_y + (shape_total_height - 1) - bottom_padding
-
-        if bottom_edge_position >= constants.GAME_HEIGHT:
-            return True
-
-        # iterate through 4x4 grid of minos
-
-        shape_data = self.active_tetromino.get_shape_data()
-
-        for index, mino_value in enumerate(shape_data):
-
-            if mino_value == 0:  # there is no mino there
-                continue  # we skip it
-
-            shape_x = index % constants.TETROMINO_SHAPE_DATA_SIZE  # gets the 2D x coordinate of the 1D shape_data
-            shape_y = index // constants.TETROMINO_SHAPE_DATA_SIZE  # gets the 2D y coordinate of the 1D shape_data
 
-            # if there is a mino there, iterate through all pixels of that mino
-            for x_offset in range(constants.MINO_SIZE):
-                for y_offset in range(constants.MINO_SIZE):
-
-                    absolute_pixel_x = proposed_x + shape_x * constants.MINO_SIZE + x_offset
-                    absolute_pixel_y = proposed_y + shape_y * constants.MINO_SIZE + y_offset
-
-                    sand_bitmap_x = absolute_pixel_x
-                    sand_bitmap_y = absolute_pixel_y - constants.INFO_BAR_HEIGHT
-
-                    if (not self.sand_pile.is_empty_at((sand_bitmap_x, sand_bitmap_y))):
-                        return True
-
-        return False
+        # The same question about the same sand has the same answer (see CollisionCache)
+        key = (
+            self.active_tetromino.shape_type,
+            self.active_tetromino.orientation,
+            proposed_x,
+            proposed_y,
+            self.sand_pile.get_generation(proposed_y - constants.INFO_BAR_HEIGHT, shape_total_height),
+        )
+        colliding = self.collision_cache.get(key)
+
+        if colliding is None:
+            # Get the vertical space that is empty in the tetromino's shape
+            bottom_padding = self.active_tetromino.get_bottom_padding()
+            bottom_edge_position = proposed_y + (shape_total_height - 1) - bottom_padding
+
+            if bottom_edge_position >= constants.GAME_HEIGHT:
+                colliding = True
+            else:
+                # Compare the piece's precomputed pixel row masks against the sand pile's row occupancy.
+                # The sand bitmap starts INFO_BAR_HEIGHT px below the top of the screen.
+                colliding = self.sand_pile.overlaps_pixel_masks(
+                    self.active_tetromino.get_pixel_masks(),
+                    proposed_x,
+                    proposed_y - constants.INFO_BAR_HEIGHT,
+                )
+            self.collision_cache.put(key, colliding)
+
+        self.profiler.stop(constants.FramePhase.COLLISION)
+        return colliding
 
     def _tetromino_hits_wall(self, proposed_x: int) -> bool:
         """
@@ -129,6 +170,7 @@ class Game:
         Returns:
             bool: True if the tetromino would collide with the wall, False otherwise.
         """
+        self.profiler.start(constants.FramePhase.COLLISION)
 
         # Get the amount of horizontal space on the left and right that is empty in the tetromino's shape
         left_padding = self.active_tetromino.get_left_padding()
@@ -145,35 +187,34 @@ class Game:
         hits_left_wall = left_edge_position < 0
         hits_right_wall = right_edge_position >= constants.GAME_WIDTH
 
+        self.profiler.stop(constants.FramePhase.COLLISION)
         return hits_left_wall or hits_right_wall
 
     def _handle_rotations(self):
-        original_orientation = self.active_tetromino.orientation
-        original_x = self.active_tetromino.x
-        original_y = self.active_tetromino.y
-
-        self.active_tetromino.rotate()
-
-        if self._is_tetromino_collision(original_x, original_y):
-            self.active_tetromino.set_orientation(original_orientation)
-
-        elif self._tetromino_hits_wall(original_x):
-            shift_found = False
+        """
+        Rotates the active tetromino clockwise if it fits. The kicks to try come from the precomputed tables in
+        wall_kicks.py (see constants.KICK_ORDER), which only hold positions inside the walls, so each one is
+        a sand collision check; the first one that fits is taken. If none fits, or a probe hits sand, the piece
+        does not rotate.
+        """
+        tetromino = self.active_tetromino
+        original_orientation = tetromino.orientation
+        original_x = tetromino.x
+        original_y = tetromino.y
 
-            for shift in range(1, constants.MAX_SHIFTS + 1):
-                self.active_tetromino.x = original_x - shift
-                if not self._tetromino_hits_wall(self.active_tetromino.x):
-                    shift_found = True
-                    break
+        tetromino.rotate()
+        kicks = wall_kicks.get_kicks(tetromino.shape_type, original_orientation, tetromino.orientation, original_x)
 
-                self.active_tetromino.x = original_x + shift
-                if not self._tetromino_hits_wall(self.active_tetromino.x):
-                    shift_found = True
+        for dx, dy, refuse_if_blocked in kicks:
+            if self._is_tetromino_collision(original_x + dx, original_y + dy):
+                if refuse_if_blocked:
                     break
+            elif not refuse_if_blocked:
+                tetromino.x = original_x + dx
+                tetromino.y = original_y + dy
+                return
 
-            if not shift_found:
-                self.active_tetromino.set_orientation(original_orientation)
-                self.active_tetromino.x = original_x
+        tetromino.set_orientation(original_orientation)
 
     def _update_all_models(self, dt: float, inputs):
 
@@ -183,6 +224,12 @@ class Game:
             self._handle_rotations()
             self.time_since_tapped = 0.0
 
+        # --- Hard Drop: a shake drops the piece to where it lands, and it lands right away ---
+        if inputs["shaken"] and constants.SHAKE_HARD_DROPS:
+            self.active_tetromino.y = self._get_landing_y()
+            self._land_active_tetromino()
+            return
+
         old_x = self.active_tetromino.x
         old_y = self.active_tetromino.y
         new_x, new_y = self.active_tetromino.get_next_position(dt, inputs["tilt_angle"])
@@ -193,70 +240,202 @@ class Game:
         # --- Logic to Deal when Tetromino Collides ---
 
         if colliding:
+            self._land_active_tetromino()
+            return
+
+        elif hits_wall:
+            new_x = old_x
 
-            # --- If it cannot be placed below the INFO_BAR_HEIGHT, then it's GAME OVER ---
-            if self.active_tetromino.y - self.active_tetromino.get_top_padding() < constants.INFO_BAR_HEIGHT:
-                self.is_game_over = True
+        self.active_tetromino.execute_approved_move(new_x, new_y)
 
-            self.sand_pile.transform_and_activate_tetromino_to_sand(self.active_tetromino, self.graphics_manager.sprite_sheet_bitmap)
+    def _land_active_tetromino(self):
+        """ Turns the active tetromino into sand where it is, and brings in the next one. """
 
-            if (self.num_tetrominoes_dropped != 0 and self.num_tetrominoes_dropped % constants.TETROMINO_FALLEN_NEXT_LEVEL == 0):
-                self.active_tetromino.decrement_fall_rate()
+        # --- If it cannot be placed below the INFO_BAR_HEIGHT, then it's GAME OVER ---
+        if self.active_tetromino.y - self.active_tetromino.get_top_padding() < constants.INFO_BAR_HEIGHT:
+            self.is_game_over = True
 
-            self.active_tetromino.reset(self.next_shape, self.next_color)
+        self.sand_pile.transform_and_activate_tetromino_to_sand(self.active_tetromino, self.graphics_manager.sprite_sheet_bitmap)
 
-            self.next_shape = self._get_random_shape()
+        if (self.num_tetrominoes_dropped != 0 and self.num_tetrominoes_dropped % constants.TETROMINO_FALLEN_NEXT_LEVEL == 0):
+            self.active_tetromino.decrement_fall_rate()
 
-            if random.random() < constants.NEXT_COLOR_CHANCE:
-                self.next_color = self._get_random_color()
+        self.active_tetromino.reset(self.next_shape, self.next_color)
 
-            self.num_tetrominoes_dropped += 1
-            return
+        self.next_shape = self._get_random_shape()
 
-        elif hits_wall:
-            new_x = old_x
+        if self.random_bits.random() < constants.NEXT_COLOR_CHANCE:
+            self.next_color = self._get_random_color()
 
-        self.active_tetromino.execute_approved_move(new_x, new_y)
+        self.num_tetrominoes_dropped += 1
+
+    def _get_landing_y(self) -> int:
+        """
+        Returns the y-coordinate at which the active tetromino would land if it fell straight down from where it is,
+        for the hard drop and the ghost piece. This is one pass over the sand's column heights (see
+        SandPile.find_landing_y) instead of a collision check for every row on the way down.
+
+        It is not timed as COLLISION, since the ghost piece calls it while the views are timed.
+        """
+        # The sand bitmap starts INFO_BAR_HEIGHT px below the top of the screen
+        return self.sand_pile.find_landing_y(
+            self.active_tetromino.get_geometry(),
+            self.active_tetromino.x,
+            self.active_tetromino.y - constants.INFO_BAR_HEIGHT,
+        ) + constants.INFO_BAR_HEIGHT
+
+
+    def _latch_inputs(self, inputs):
+        """
+        Remembers a polled tap or shake until a simulation step uses it. Inputs are polled at INPUT_RATE,
+        independently of the simulation steps, so a tap could otherwise be overwritten by the next poll
+        before any step ran, or be seen by several catch-up steps.
+        """
+        self._tap_latched = self._tap_latched or inputs["tapped"]
+        self._shake_latched = self._shake_latched or inputs["shaken"]
 
-        # --- SandPile Update ---
-        if (self.tick_count % constants.SLOW_MULTIPLIER == 0):
-            self.sand_pile.apply_sand_physics()
+    def _get_step_inputs(self, inputs):
+        """ Returns the inputs for one simulation step, which uses up the latched tap and shake. """
+        tapped = self._tap_latched
+        shaken = self._shake_latched
+        self._tap_latched = False
+        self._shake_latched = False
+
+        if tapped == inputs["tapped"] and shaken == inputs["shaken"]:
+            return inputs
+        return {"shaken": shaken, "tapped": tapped, "tilt_angle": inputs["tilt_angle"]}
 
     def _update_all_views(self):
         self.graphics_manager.begin_frame()
 
-        self.active_tetromino_view.update(
+        # With GridBackend.SHADOW, this is the only point at which the display sees the sand change
+        sand_changed = self.sand_pile.commit_dirty_rows() > 0
+
+        tetromino_changed = self.active_tetromino_view.update(
             self.active_tetromino.get_shape_data(),
             self.active_tetromino.color_type,
             self.active_tetromino.x,
             self.active_tetromino.y,
+            self._get_landing_y() if constants.SHOW_GHOST_PIECE else None,
         )
 
-        self.graphics_manager.end_frame()
+        # A line clear flashes by swapping palette colors, which the dirty rows do not see
+        changed = sand_changed or tetromino_changed or self.line_clear.is_running()
+
+        # Only refresh the display when something on it changed
+        self.profiler.start(constants.FramePhase.REFRESH)
+        self.graphics_manager.end_frame(changed)
+        self.profiler.stop(constants.FramePhase.REFRESH)
+
+    def _report_profile(self):
+        """ Prints the profiler's summary, followed by the governor, collision cache and display counters. """
+        self.profiler.report()
+        print("  sand quality level {} (load {:.2f})".format(self.governor.level, self.governor.last_load))
+        print("  collision cache {} hits, {} misses".format(self.collision_cache.hits, self.collision_cache.misses))
+        print("  display {} refreshes, {} skipped (unchanged), {} deferred (too soon)".format(
+            self.graphics_manager.num_refreshes,
+            self.graphics_manager.num_skipped_refreshes,
+            self.graphics_manager.num_deferred_refreshes,
+        ))
+
+    def start_game_loop(self, fast_forward: bool = False, max_ticks: int = None):
+        """
+        Runs the game until it is over.
 
-    def start_game_loop(self):
-        while not self.is_game_over:
+        Every frame, the Scheduler decides what is due: input polls, fixed simulation steps of SIMULATION_STEP
+        seconds (a tick), sand physics steps and a render, each at its own rate (see constants). A slow frame
+        is caught up with a bounded number of extra ticks, so the game keeps its speed when the sand gets busy.
 
-            start_frame_time = time.monotonic()
-            dt = start_frame_time - self.last_frame_time
-            self.last_frame_time = start_frame_time
+        Args:
+            fast_forward (bool): Run on a virtual clock (see headless.VirtualClock) instead of sleeping, so the
+                game plays out at full CPU speed, and return at game over instead of idling forever.
+            max_ticks (int): Stop after this many ticks even if the game is not over yet.
+        """
+        if fast_forward:
+            from headless import VirtualClock
+            if not isinstance(self.clock, VirtualClock):
+                self.clock = VirtualClock(self.clock.monotonic())
+            self.last_frame_time = self.clock.monotonic()
 
-            inputs = self.inputs_manager.get_all_inputs()
-            self._update_all_models(dt, inputs)
-            self._update_all_views()
+        scheduler = self.scheduler
+        profiler = self.profiler
+        inputs = None
 
-            self.time_since_tapped += dt
+        while not self.is_game_over:
 
-            frame_time = time.monotonic() - start_frame_time
-            sleep_time = constants.TICK_RATE - frame_time
+            if max_ticks is not None and self.tick_count >= max_ticks:
+                return
 
-            self.tick_count += 1
+            start_frame_time = self.clock.monotonic()
+            elapsed = start_frame_time - self.last_frame_time
+            self.last_frame_time = start_frame_time
+
+            profiler.begin_frame()
+
+            # --- Inputs ---
+            if scheduler.inputs.advance(elapsed) or inputs is None:
+                profiler.start(constants.FramePhase.INPUTS)
+                inputs = self.inputs_manager.get_all_inputs()
+                self._latch_inputs(inputs)
+                profiler.stop(constants.FramePhase.INPUTS)
+
+            # --- Simulation (fixed steps) ---
+            # The collision checks inside are subtracted from this (see FrameProfiler)
+            num_simulation_steps = scheduler.simulation.advance(elapsed)
+            profiler.start(constants.FramePhase.TETROMINO)
+            for _ in range(num_simulation_steps):
+                self._update_all_models(constants.SIMULATION_STEP, self._get_step_inputs(inputs))
+                self.time_since_tapped += constants.SIMULATION_STEP
+                self.tick_count += 1
+                if self.is_game_over:
+                    break
+            profiler.stop(constants.FramePhase.TETROMINO)
+
+            # --- Sand Physics (time-budgeted) ---
+            profiler.start(constants.FramePhase.SAND)
+            num_sand_steps = scheduler.sand.advance(elapsed)
+            if num_sand_steps == 0 and self.sand_pile.has_unfinished_step():
+                num_sand_steps = 1  # finish the step that ran out of budget last frame
+            for _ in range(num_sand_steps):
+                self.sand_pile.apply_sand_physics(max_seconds=self.governor.sand_time_budget)
+                if self.sand_pile.has_unfinished_step():
+                    break  # out of budget; the backlog carries over to the next frame
+
+            # Clear the same-color paths from wall to wall (close to free when there are none). A clear runs
+            # over several frames; no new path is looked for until it is done.
+            if self.line_clear.is_running():
+                self.score += self.line_clear.update(elapsed)
+            elif num_sand_steps:
+                grains = self.sand_pile.find_lines()
+                if grains:
+                    self.line_clear.start(grains)
+            profiler.stop(constants.FramePhase.SAND)
+
+            # --- Rendering (skipped while catching up) ---
+            if scheduler.should_render(elapsed, num_simulation_steps):
+                profiler.start(constants.FramePhase.VIEWS)
+                self._update_all_views()
+                profiler.stop(constants.FramePhase.VIEWS)
+
+            frame_time = self.clock.monotonic() - start_frame_time
+            sleep_time = scheduler.time_until_next_step() - frame_time
+
+            self.governor.record_frame(frame_time, elapsed)
+
+            # The summary is only printed in real time; in fast-forward the samples are still recorded
+            if profiler.end_frame(start_frame_time + frame_time) and not fast_forward:
+                self._report_profile()
 
             if sleep_time > 0:
-                time.sleep(sleep_time)
+                self.clock.sleep(sleep_time)
+
+        if fast_forward:
+            return
 
-            print("Tick", self.tick_count, "-", max(constants.TICK_RATE, frame_time), "seconds.")
+        self.show_game_over()
 
+    def show_game_over(self):
+        """ Idles forever once the game is over. """
         while True:
             print("GAME OVER")
             time.sleep(60)
@@ -1,5 +1,10 @@
 # graphics_manager.py
 
+from __future__ import annotations
+
+import time
+
+from tetromino import Tetromino
 import constants
 
 import displayio
@@ -38,26 +43,55 @@ class GraphicsManager:
 
         self.sprite_sheet_palette.make_transparent(0)
 
+        # The display only refreshes when end_frame asks it to, so a frame in which nothing changed costs nothing
+        self._display.auto_refresh = False
+        self._refresh_pending = False  # a changed frame whose refresh was deferred
+        self._min_refresh_interval = (1.0 - constants.DISPLAY_REFRESH_SLACK) / constants.DISPLAY_TARGET_FPS
+        self._last_refresh_time = None
+
+        # --- Refresh statistics (the time they take is the profiler's REFRESH phase) ---
+        self.num_refreshes = 0
+        self.num_skipped_refreshes = 0   # frames in which nothing changed
+        self.num_deferred_refreshes = 0  # refreshes that came too soon after the last one (see DISPLAY_TARGET_FPS)
+
 
     def begin_frame(self):
         """
-        Disable the display's automatic refresh.
-
-        This method prepares the display for a batch of drawing operations
-        by turning off automatic screen updates. This can improve performance
-        and prevent flickering during multiple graphical changes.
+        Starts a batch of drawing operations. Automatic refresh is off for good (see __init__), so nothing
+        drawn from here on shows up until end_frame.
         """
-        self._display.auto_refresh = False
+        pass
 
-    def end_frame(self):
+    def end_frame(self, changed: bool = True) -> bool:
         """
-        Re-enable the display's automatic refresh.
+        Ends the batch of drawing operations and shows all the accumulated changes at once, with one
+        explicit refresh. The refresh is skipped entirely when nothing changed.
+
+        Args:
+            changed (bool): Whether anything on the display changed since the last end_frame.
 
-        This method signals the end of the batch drawing operations by turning
-        automatic screen updates back on, allowing the display to refresh and
-        show all the accumulated changes at once.
+        Returns:
+            bool: Whether the display was refreshed.
         """
-        self._display.auto_refresh = True
+        if not changed and not self._refresh_pending:
+            self.num_skipped_refreshes += 1
+            return False
+
+        # display.refresh(target_frames_per_second=...) would busy-wait for its next frame slot, blocking the
+        # game (and every asyncio task) meanwhile, and drop a refresh called late. So the display is refreshed
+        # right away, and the frame rate is capped here instead: a refresh that comes too soon is deferred to
+        # the next end_frame, even if nothing changes in that frame.
+        now = time.monotonic()
+        if self._last_refresh_time is not None and now - self._last_refresh_time < self._min_refresh_interval:
+            self._refresh_pending = True
+            self.num_deferred_refreshes += 1
+            return False
+
+        self._display.refresh()
+        self._last_refresh_time = now
+        self._refresh_pending = False
+        self.num_refreshes += 1
+        return True
 
     def create_infobar_group(self):
         """ helper class for constructor to create infobar layout. """
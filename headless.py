@@ -0,0 +1,179 @@
+# headless.py
+# Runs the game without the MatrixPortal: a display backend built on the headless_displayio stand-ins,
+# a scripted input source instead of the accelerometer, and a virtual clock so that a game runs at full
+# CPU speed instead of at TPS. Simulate a batch of games on a desktop with `python headless.py`.
+
+import time
+
+from headless_displayio import Group, load_bmp
+from random_pool import RandomBitPool
+import constants
+
+SIMULATION_SEED = 1234
+NUM_SIMULATED_GAMES = 100
+MAX_TICKS_PER_GAME = 100000  # in case a scripted player never loses
+
+# The inputs of a player that does nothing (the same values InputsManager returns when I2C fails)
+NEUTRAL_INPUTS = {"shaken": False, "tapped": False, "tilt_angle": 0.0}
+
+
+def _default_sprite_sheet_path() -> str:
+    """ The spritesheet.bmp next to this file (on the board it lives at /spritesheet.bmp). """
+    directory = __file__.rpartition("/")[0]
+    return (directory or ".") + "/spritesheet.bmp"
+
+
+class HeadlessGraphicsManager:
+    """
+    A stand-in for GraphicsManager with the same attributes (root_group, sprite_sheet_bitmap,
+    sprite_sheet_palette) and frame methods, built on the headless_displayio objects. Nothing is drawn,
+    but the bitmaps and tile grids hold exactly what the LED matrix would show.
+    """
+
+    def __init__(self, sprite_sheet_path: str = None):
+        """
+        Args:
+            sprite_sheet_path (str): The sprite sheet BMP. Defaults to the spritesheet.bmp next to this file.
+        """
+        self.root_group = Group()
+
+        self.sprite_sheet_bitmap, self.sprite_sheet_palette = load_bmp(
+            sprite_sheet_path if sprite_sheet_path is not None else _default_sprite_sheet_path()
+        )
+        self.sprite_sheet_palette.make_transparent(0)
+
+        # The same statistics as GraphicsManager (a headless refresh is never deferred)
+        self.num_refreshes = 0
+        self.num_skipped_refreshes = 0
+        self.num_deferred_refreshes = 0
+
+    def begin_frame(self):
+        """ Nothing to hold back without a display. """
+        pass
+
+    def end_frame(self, changed: bool = True) -> bool:
+        """ Counts the refresh that would have happened, or the one that GraphicsManager would have skipped. """
+        if not changed:
+            self.num_skipped_refreshes += 1
+            return False
+        self.num_refreshes += 1
+        return True
+
+
+class ScriptedInputsManager:
+    """
+    A stand-in for InputsManager that plays back scripted inputs instead of reading the accelerometer.
+
+    The script is either a sequence of input dicts (one per tick, in the format InputsManager.get_all_inputs
+    returns) or a function that takes the tick number and returns the input dict for that tick.
+    Once a sequence runs out, the player does nothing (NEUTRAL_INPUTS).
+    """
+
+    def __init__(self, script=()):
+        self.script = script
+        self.tick = 0
+
+    def get_all_inputs(self):
+        """
+        Returns:
+            dict: The scripted inputs for the current tick, e.g. {'shaken': bool, 'tapped': bool, 'tilt_angle': float}
+        """
+        tick = self.tick
+        self.tick += 1
+
+        if callable(self.script):
+            return self.script(tick)
+        if tick < len(self.script):
+            return self.script[tick]
+        return NEUTRAL_INPUTS
+
+
+class VirtualClock:
+    """
+    A stand-in for the time module (monotonic() and sleep()) whose time only moves when the game sleeps.
+    Every frame then takes no time, so each tick sleeps for exactly TICK_RATE, and a game plays out the
+    same way no matter how fast the machine is.
+    """
+
+    def __init__(self, start_time: float = 0.0):
+        self.now = start_time
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+def random_player(random_bits: RandomBitPool):
+    """
+    Returns a script (see ScriptedInputsManager) for a player who tilts the board at random and sometimes taps.
+    The choices come from random_bits, so a seeded pool always plays the same way.
+    """
+    tilt_angles = (-30.0, 0.0, 30.0)
+    state = {"tilt_angle": 0.0}
+
+    def script(tick: int):
+        if random_bits.randbelow(16) == 0:  # change the tilt about every 16 ticks
+            state["tilt_angle"] = random_bits.choice(tilt_angles)
+        return {
+            "shaken": False,
+            "tapped": random_bits.randbelow(32) == 0,
+            "tilt_angle": state["tilt_angle"],
+        }
+
+    return script
+
+
+def create_headless_game(script=(), random_bits: RandomBitPool = None):
+    """
+    Creates a Game on the headless backends.
+
+    Args:
+        script: The inputs to play back (see ScriptedInputsManager).
+        random_bits (RandomBitPool): The game's random bits. Defaults to a pool seeded with constants.RANDOM_SEED.
+    """
+    from game import Game
+
+    return Game(
+        inputs_manager=ScriptedInputsManager(script),
+        graphics_manager=HeadlessGraphicsManager(),
+        clock=VirtualClock(),
+        random_bits=random_bits,
+    )
+
+
+def simulate_games(num_games: int = NUM_SIMULATED_GAMES, seed: int = SIMULATION_SEED):
+    """
+    Plays num_games games with random_player in fast-forward mode, each with its own seed.
+
+    Returns:
+        list: (ticks, tetrominoes dropped, score) for every game.
+    """
+    results = []
+
+    for game_index in range(num_games):
+        random_bits = RandomBitPool(seed + game_index)
+        game = create_headless_game(random_player(random_bits), random_bits)
+        game.start_game_loop(fast_forward=True, max_ticks=MAX_TICKS_PER_GAME)
+        results.append((game.tick_count, game.num_tetrominoes_dropped, game.score))
+
+    return results
+
+
+def main():
+    start = time.monotonic()
+    results = simulate_games()
+    elapsed = time.monotonic() - start
+
+    total_ticks = sum(ticks for ticks, _, _ in results)
+    total_dropped = sum(dropped for _, dropped, _ in results)
+    total_score = sum(score for _, _, score in results)
+    print("{} games, {} ticks ({:.1f} game minutes) in {:.1f} s, {:.1f} tetrominoes and {:.1f} points per game".format(
+        len(results), total_ticks, total_ticks * constants.TICK_RATE / 60, elapsed,
+        total_dropped / len(results), total_score / len(results),
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# headless_displayio.py
+# Pure-Python stand-ins for the parts of displayio the game uses (Bitmap, Palette, TileGrid, Group),
+# plus a small BMP loader that replaces adafruit_imageload. They hold the same state as the real
+# objects but draw nothing, so the views and the SandPile run unchanged on a desktop (see headless.py).
+# The view modules fall back to this module when displayio cannot be imported.
+
+
+class Bitmap:
+    """
+    A width x height grid of palette indices. Like displayio.Bitmap, it can be indexed with an
+    (x, y) tuple or with a flat index (x + y * width).
+    """
+
+    def __init__(self, width: int, height: int, value_count: int):
+        if value_count > 256:
+            raise ValueError("value_count must be at most 256")
+
+        self.width = width
+        self.height = height
+        self.value_count = value_count
+        self._pixels = bytearray(width * height)
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            x, y = index
+            return self._pixels[x + y * self.width]
+        return self._pixels[index]
+
+    def __setitem__(self, index, value: int):
+        if isinstance(index, tuple):
+            x, y = index
+            self._pixels[x + y * self.width] = value
+        else:
+            self._pixels[index] = value
+
+    def __len__(self):
+        return len(self._pixels)
+
+    def fill(self, value: int):
+        self._pixels[:] = bytes((value,)) * len(self._pixels)
+
+
+class Palette:
+    """ A list of 0xRRGGBB colors, any of which can be made transparent. """
+
+    def __init__(self, color_count: int):
+        self._colors = [0] * color_count
+        self._transparent = bytearray(color_count)
+
+    def __len__(self):
+        return len(self._colors)
+
+    def __getitem__(self, index: int) -> int:
+        return self._colors[index]
+
+    def __setitem__(self, index: int, color: int):
+        self._colors[index] = color
+
+    def make_transparent(self, index: int):
+        self._transparent[index] = 1
+
+    def make_opaque(self, index: int):
+        self._transparent[index] = 0
+
+    def is_transparent(self, index: int) -> bool:
+        return self._transparent[index] == 1
+
+
+class TileGrid:
+    """
+    A width x height grid of tiles, each one a tile_width x tile_height area of the source bitmap.
+    Tiles are numbered row by row across the source bitmap, like in displayio.TileGrid.
+    """
+
+    def __init__(
+        self,
+        bitmap,
+        *,
+        pixel_shader,
+        width: int = 1,
+        height: int = 1,
+        tile_width: int = None,
+        tile_height: int = None,
+        default_tile: int = 0,
+        x: int = 0,
+        y: int = 0,
+    ):
+        self.bitmap = bitmap
+        self.pixel_shader = pixel_shader
+        self.width = width
+        self.height = height
+        self.tile_width = tile_width if tile_width is not None else bitmap.width
+        self.tile_height = tile_height if tile_height is not None else bitmap.height
+        self.x = x
+        self.y = y
+        self.hidden = False
+        self._tiles = bytearray([default_tile]) * (width * height)
+
+    def __getitem__(self, index) -> int:
+        if isinstance(index, tuple):
+            x, y = index
+            index = x + y * self.width
+        return self._tiles[index]
+
+    def __setitem__(self, index, tile_index: int):
+        if isinstance(index, tuple):
+            x, y = index
+            index = x + y * self.width
+        self._tiles[index] = tile_index
+
+
+class Group:
+    """ An ordered list of TileGrids and Groups, drawn on top of each other at an (x, y) offset. """
+
+    def __init__(self, *, scale: int = 1, x: int = 0, y: int = 0):
+        self.scale = scale
+        self.x = x
+        self.y = y
+        self.hidden = False
+        self._layers = []
+
+    def __len__(self):
+        return len(self._layers)
+
+    def __getitem__(self, index: int):
+        return self._layers[index]
+
+    def __setitem__(self, index: int, layer):
+        self._layers[index] = layer
+
+    def __iter__(self):
+        return iter(self._layers)
+
+    def append(self, layer):
+        self._layers.append(layer)
+
+    def insert(self, index: int, layer):
+        self._layers.insert(index, layer)
+
+    def index(self, layer) -> int:
+        return self._layers.index(layer)
+
+    def remove(self, layer):
+        self._layers.remove(layer)
+
+    def pop(self, index: int = -1):
+        return self._layers.pop(index)
+
+
+def load_bmp(filename: str):
+    """
+    Loads an uncompressed 1, 4 or 8 bit palette BMP (like spritesheet.bmp), the same way
+    adafruit_imageload.load(filename, bitmap=displayio.Bitmap, palette=displayio.Palette) does.
+
+    Returns:
+        tuple: (Bitmap, Palette)
+    """
+    with open(filename, "rb") as file:
+        data = file.read()
+
+    if data[0:2] != b"BM":
+        raise ValueError("{} is not a BMP file".format(filename))
+
+    pixel_data_offset = int.from_bytes(data[10:14], "little")
+    header_size = int.from_bytes(data[14:18], "little")
+    width = int.from_bytes(data[18:22], "little")
+    height = int.from_bytes(data[22:26], "little")
+    bits_per_pixel = int.from_bytes(data[28:30], "little")
+    compression = int.from_bytes(data[30:34], "little")
+    color_count = int.from_bytes(data[46:50], "little")
+
+    if bits_per_pixel not in (1, 4, 8) or compression != 0:
+        raise ValueError("Only uncompressed 1, 4 and 8 bit BMP files are supported")
+
+    # The height is stored as a signed int. Positive means the rows are stored bottom-up.
+    if height >= 1 << 31:
+        height -= 1 << 32
+    bottom_up = height > 0
+    height = abs(height)
+
+    if color_count == 0:
+        color_count = 1 << bits_per_pixel
+
+    # The color table follows the header, one (blue, green, red, unused) entry per color
+    palette = Palette(color_count)
+    color_table_start = 14 + header_size
+    for index in range(color_count):
+        blue, green, red = data[color_table_start + index * 4:color_table_start + index * 4 + 3]
+        palette[index] = (red << 16) | (green << 8) | blue
+
+    bitmap = Bitmap(width, height, color_count)
+    row_size = ((width * bits_per_pixel + 31) // 32) * 4  # rows are padded to 4 bytes
+    pixels_per_byte = 8 // bits_per_pixel
+    pixel_mask = (1 << bits_per_pixel) - 1
+
+    for row in range(height):
+        row_start = pixel_data_offset + row * row_size
+        y = height - 1 - row if bottom_up else row
+        for x in range(width):
+            byte = data[row_start + x // pixels_per_byte]
+            shift = 8 - bits_per_pixel * (x % pixels_per_byte + 1)  # the leftmost pixel is in the high bits
+            bitmap[x, y] = (byte >> shift) & pixel_mask
+
+    return bitmap, palette
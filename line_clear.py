@@ -0,0 +1,93 @@
+# line_clear.py
+
+import constants
+
+
+class LineClearAnimation:
+    """
+    Clears a same-color path over several frames instead of all at once, so that a big clear does not
+    stutter the game:
+
+    1) FLASHING: the path's grains are marked with SAND_FLASH_INDEX once, and then blink between
+       SAND_FLASH_COLOR and the path's own color by swapping that one palette entry.
+    2) ERASING: the grains are erased, at most CLEAR_ERASE_GRAINS_PER_FRAME per frame. Until then they
+       are still sand, so the sand above them stays put. The grains come top row first (see
+       SandConnectivity.take_spanning_components), so the ones still waiting always keep their support.
+    3) The sand above the path is released (activated), and apply_sand_physics lets it fall into the gap.
+
+    It only touches the SandPile and its view, so the tetromino keeps moving while it runs.
+    """
+
+    def __init__(self, sand_pile, sand_pile_view):
+        """
+        Args:
+            sand_pile (SandPile): The sand to clear the path from.
+            sand_pile_view (SandPileView): The view whose palette does the flashing.
+        """
+        self.sand_pile = sand_pile
+        self.sand_pile_view = sand_pile_view
+
+        self.phase = constants.ClearPhase.IDLE
+        self._grains = None
+        self._num_erased = 0
+        self._phase_time = 0.0
+        self._path_color = 0
+        self._flash_on = False
+
+    def is_running(self) -> bool:
+        return self.phase != constants.ClearPhase.IDLE
+
+    def start(self, grains):
+        """
+        Starts clearing the grains (flat indices, see SandPile.find_lines). Their colors are remembered for
+        the flash before they are marked with the flash index.
+        """
+        self._grains = grains
+        self._num_erased = 0
+        self._path_color = self.sand_pile_view.get_color(self.sand_pile.grid.cells[grains[0]])
+
+        self.sand_pile.mark_grains(grains, constants.SAND_FLASH_INDEX)
+        self._flash_on = True
+        self.sand_pile_view.set_flash_color(constants.SAND_FLASH_COLOR)
+
+        self.phase = constants.ClearPhase.FLASHING
+        self._phase_time = 0.0
+
+    def update(self, elapsed: float) -> int:
+        """
+        Advances the animation by one frame.
+
+        Args:
+            elapsed (float): The time in seconds since the last frame.
+
+        Returns:
+            int: The number of grains cleared, once the path is gone (0 until then).
+        """
+        if self.phase == constants.ClearPhase.FLASHING:
+            self._phase_time += elapsed
+            if self._phase_time >= constants.CLEAR_FLASH_DURATION:
+                self.phase = constants.ClearPhase.ERASING
+                return 0
+
+            flash_on = int(self._phase_time / constants.CLEAR_FLASH_INTERVAL) % 2 == 0
+            if flash_on != self._flash_on:
+                self._flash_on = flash_on
+                self.sand_pile_view.set_flash_color(constants.SAND_FLASH_COLOR if flash_on else self._path_color)
+            return 0
+
+        if self.phase == constants.ClearPhase.ERASING:
+            grains = self._grains
+            last = min(self._num_erased + constants.CLEAR_ERASE_GRAINS_PER_FRAME, len(grains))
+            self.sand_pile.erase_grains(grains, self._num_erased, last)
+            self._num_erased = last
+
+            if last < len(grains):
+                return 0
+
+            self.sand_pile.release_grains_above(grains)
+            self.sand_pile_view.set_flash_color(constants.SAND_FLASH_COLOR)
+            self._grains = None
+            self.phase = constants.ClearPhase.IDLE
+            return len(grains)
+
+        return 0
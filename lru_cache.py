@@ -0,0 +1,36 @@
+# lru_cache.py
+
+
+class LRUCache:
+    """
+    A small least-recently-used cache: a dict of values plus the keys in the order they were last used.
+    Once it holds max_entries values, putting a new one evicts the least recently used.
+    Values must not be None, which get() returns on a miss.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._values = {}
+        self._keys_by_age = []  # least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """ Returns the value for key, or None on a miss. """
+        value = self._values.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if self._keys_by_age[-1] != key:
+            self._keys_by_age.remove(key)
+            self._keys_by_age.append(key)
+        return value
+
+    def put(self, key, value):
+        """ Remembers the value for a key that just missed. """
+        if len(self._keys_by_age) >= self.max_entries:
+            del self._values[self._keys_by_age.pop(0)]
+        self._values[key] = value
+        self._keys_by_age.append(key)
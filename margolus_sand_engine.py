@@ -0,0 +1,216 @@
+# margolus_sand_engine.py
+
+import constants
+
+# --- Block Cells ---
+# A Margolus block is 2x2 pixels. Its occupancy is a 4-bit state: bit 0 is the top-left cell,
+# bit 1 the top-right, bit 2 the bottom-left and bit 3 the bottom-right. This matches the row masks:
+# (top_row_mask >> x) & 3 gives the top two bits and (bottom_row_mask >> x) & 3 the bottom two.
+TOP_LEFT = 0
+TOP_RIGHT = 1
+BOTTOM_LEFT = 2
+BOTTOM_RIGHT = 3
+
+# The flat index offset of each cell from the block's top-left pixel
+CELL_OFFSETS = (0, 1, constants.GAME_WIDTH, constants.GAME_WIDTH + 1)
+
+NO_MOVE = 0xFF
+
+
+def _resolve_block(state: int, slide: bool):
+    """
+    Applies the sand rules to one block state.
+
+    1) Straight falls: a top grain with an empty cell below it falls.
+    2) Diagonal slides: a top grain that stayed, resting on a grain, slides into the empty bottom cell
+       on the other side. Whether it slides this step or waits is the random part (`slide`), which breaks
+       up the regular 45 degree patterns that a purely deterministic block rule produces.
+
+    Returns:
+        tuple: (new state, list of moves). A move is (source cell, destination cell).
+    """
+    occupied = [(state >> cell) & 1 for cell in range(4)]
+    moves = []
+
+    def move(source: int, destination: int):
+        occupied[source] = 0
+        occupied[destination] = 1
+        moves.append((source, destination))
+
+    if occupied[TOP_LEFT] and not occupied[BOTTOM_LEFT]:
+        move(TOP_LEFT, BOTTOM_LEFT)
+    if occupied[TOP_RIGHT] and not occupied[BOTTOM_RIGHT]:
+        move(TOP_RIGHT, BOTTOM_RIGHT)
+
+    if slide:
+        if occupied[TOP_LEFT] and occupied[BOTTOM_LEFT] and not occupied[BOTTOM_RIGHT]:
+            move(TOP_LEFT, BOTTOM_RIGHT)
+        elif occupied[TOP_RIGHT] and occupied[BOTTOM_RIGHT] and not occupied[BOTTOM_LEFT]:
+            move(TOP_RIGHT, BOTTOM_LEFT)
+
+    new_state = 0
+    for cell in range(4):
+        new_state |= occupied[cell] << cell
+    return new_state, moves
+
+
+def _build_transition_tables():
+    """
+    Builds the lookup tables, indexed by (state << 1) | random_bit:
+        next_states: the block's occupancy after the step.
+        first_moves, second_moves: source | (destination << 2), or NO_MOVE. A block never needs more than two.
+    Also returns random_states, a 16-bit mask of the states whose outcome depends on the random bit
+    (only those consume a bit from the pool), and unstable_states, the states that can move at all.
+    """
+    next_states = bytearray(32)
+    first_moves = bytearray(b"\xff" * 32)
+    second_moves = bytearray(b"\xff" * 32)
+    random_states = 0
+    unstable_states = 0
+
+    for state in range(16):
+        outcomes = []
+        for random_bit in range(2):
+            index = (state << 1) | random_bit
+            new_state, moves = _resolve_block(state, random_bit == 1)
+            next_states[index] = new_state
+            if len(moves) > 0:
+                first_moves[index] = moves[0][0] | (moves[0][1] << 2)
+            if len(moves) > 1:
+                second_moves[index] = moves[1][0] | (moves[1][1] << 2)
+            outcomes.append(new_state)
+
+        if outcomes[0] != outcomes[1]:
+            random_states |= 1 << state
+        if outcomes[0] != state or outcomes[1] != state:
+            unstable_states |= 1 << state
+
+    return bytes(next_states), bytes(first_moves), bytes(second_moves), random_states, unstable_states
+
+NEXT_STATES, FIRST_MOVES, SECOND_MOVES, RANDOM_STATES, UNSTABLE_STATES = _build_transition_tables()
+
+
+class MargolusSandEngine:
+    """
+    An alternative sand physics engine based on a Margolus neighborhood: the playfield is divided into
+    2x2 blocks, and the block grid is shifted by one pixel (diagonally) every step. Each block is updated
+    on its own with one table lookup on its 4-bit occupancy, so the result does not depend on the order the
+    blocks are visited in, unlike the in-place scan of the reference engine (the "peeling" it documents).
+
+    The block grid offset follows SandPile.odd_rows. In the shifted grid, the half blocks at the walls can
+    only let a grain fall straight down. Block rows whose top row is empty are skipped entirely, since only
+    top grains can move.
+
+    It works on every grid backend, and on the board.
+    """
+
+    def __init__(self, grid):
+        """
+        Args:
+            grid: The grid (see sand_grid.py) that the SandPile simulates on.
+        """
+        self.grid = grid
+
+        # The number of steps in a row without any block that could move. Once both block offsets
+        # have been stable, the pile is settled and the SandPile can go to sleep.
+        self._stable_steps = 0
+
+    def step(self, sand_pile) -> int:
+        """
+        Updates every 2x2 block once.
+
+        Returns:
+            int: The number of grains that moved.
+        """
+        cells = self.grid.cells
+        row_masks = sand_pile.row_masks
+        grid_width = constants.GAME_WIDTH
+        offset = 1 if sand_pile.odd_rows else 0
+
+        # The slide decisions come from the SandPile's RandomBitPool, read inline
+        random_bits = sand_pile.random_bits
+        bit_index = random_bits.bit_index
+
+        num_moved = 0
+        any_unstable = False
+
+        for y in range(offset, constants.PLAYFIELD_HEIGHT - 1, 2):
+
+            top_mask = row_masks[y]
+            if not top_mask:
+                continue  # only top grains can move
+
+            bottom_mask = row_masks[y + 1]
+            row_start = y * grid_width
+
+            for x in range(offset, grid_width - 1, 2):
+
+                top_bits = (top_mask >> x) & 3
+                if not top_bits:
+                    continue
+
+                state = top_bits | (((bottom_mask >> x) & 3) << 2)
+                if not (UNSTABLE_STATES >> state) & 1:
+                    continue
+                any_unstable = True
+
+                # Only states with two possible outcomes use up a random bit
+                index = state << 1
+                if (RANDOM_STATES >> state) & 1:
+                    if bit_index >= random_bits.num_bits:
+                        random_bits.refill()
+                        bit_index = 0
+                    index |= (random_bits.bits[bit_index >> 3] >> (bit_index & 7)) & 1
+                    bit_index += 1
+
+                new_state = NEXT_STATES[index]
+                if new_state == state:
+                    continue
+
+                # Move the grains (at most two), always into empty cells
+                top_left = row_start + x
+                move = FIRST_MOVES[index]
+                source = top_left + CELL_OFFSETS[move & 3]
+                cells[top_left + CELL_OFFSETS[move >> 2]] = cells[source]
+                cells[source] = 0
+                num_moved += 1
+
+                move = SECOND_MOVES[index]
+                if move != NO_MOVE:
+                    source = top_left + CELL_OFFSETS[move & 3]
+                    cells[top_left + CELL_OFFSETS[move >> 2]] = cells[source]
+                    cells[source] = 0
+                    num_moved += 1
+
+                # Write the new occupancy of the block into the (local copies of the) row masks
+                top_mask = (top_mask & ~(3 << x)) | ((new_state & 3) << x)
+                bottom_mask = (bottom_mask & ~(3 << x)) | ((new_state >> 2) << x)
+
+            # With the shifted block grid, the first and last columns are in half blocks that stick out of
+            # the playfield. The wall cell never moves, so the only possible move there is a straight fall.
+            if offset:
+                for x in (0, grid_width - 1):
+                    if (top_mask >> x) & 1 and not (bottom_mask >> x) & 1:
+                        any_unstable = True
+                        cells[row_start + grid_width + x] = cells[row_start + x]
+                        cells[row_start + x] = 0
+                        top_mask &= ~(1 << x)
+                        bottom_mask |= 1 << x
+                        num_moved += 1
+
+            row_masks[y] = top_mask
+            row_masks[y + 1] = bottom_mask
+
+        random_bits.bit_index = bit_index
+
+        # --- SLEEP ---
+        # Once neither block offset has a block that could move, the pile is settled.
+        if any_unstable:
+            self._stable_steps = 0
+        else:
+            self._stable_steps += 1
+            if self._stable_steps >= 2:
+                sand_pile._deactivate_all_pixels()
+                self._stable_steps = 0  # the next activation needs two more settled steps
+
+        return num_moved
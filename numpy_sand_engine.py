@@ -0,0 +1,154 @@
+# numpy_sand_engine.py
+
+import constants
+
+import numpy as np
+
+
+class NumpySandEngine:
+    """
+    An alternative sand physics engine for headless/desktop simulation. Instead of visiting active pixels
+    one at a time, it updates a whole interlaced row set (every other row) at once with NumPy masks.
+
+    It follows the same rules as SandPile.apply_sand_physics:
+        1) Straight falls: a grain with an empty pixel below it falls.
+        2) Diagonal falls: a grain that is blocked below picks a random diagonal first, then tries the other.
+           A grain whose pixel two rows below is empty is resting on a "floating pivot" and does not slide.
+        3) Only even or only odd rows are processed per step, alternating every step.
+
+    It is not pixel-for-pixel identical to the reference engine, because the reference engine resolves
+    conflicts in the (arbitrary) order that it pops pixels from the active set. Instead, all straight falls
+    happen first, then the diagonal moves are resolved direction by direction. The grain count is always
+    conserved; settled-height statistics can be compared with benchmark.compare_engines().
+
+    It requires the NUMPY grid backend and ignores the active pixel set except to know when to sleep.
+    """
+
+    def __init__(self, grid, random_bits):
+        """
+        Args:
+            grid (sand_grid.NumpyGrid): The grid that the SandPile simulates on.
+            random_bits (random_pool.RandomBitPool): The SandPile's random bits, used to seed NumPy's generator.
+        """
+
+        if not hasattr(grid, "as_2d"):
+            raise ValueError("The NUMPY sand engine requires the NUMPY grid backend")
+
+        self.grid_2d = grid.as_2d()
+
+        # Seeded from the RandomBitPool so that one seed makes this engine reproducible too.
+        # NumPy draws its per-step random masks in bulk itself.
+        self._rng = np.random.default_rng(random_bits.next_bits(32))
+
+        # The rows that can move (every row except the bottom one), split by parity.
+        # Index 0 holds the even rows and index 1 the odd rows, matching SandPile.odd_rows.
+        movable_rows = np.arange(constants.PLAYFIELD_HEIGHT - 1)
+        self._row_sets = (movable_rows[movable_rows % 2 == 0], movable_rows[movable_rows % 2 == 1])
+
+        # The number of steps in a row in which nothing moved. Once both row parities
+        # have been quiet, the pile is settled and the SandPile can go to sleep.
+        self._quiet_steps = 0
+
+    def _try_diagonal(self, source_rows, below_rows, movers, direction: int):
+        """
+        Moves every grain in `movers` one pixel down and one pixel in `direction` (1 or -1)
+        when the destination is empty. Within a single direction, no two grains can target the
+        same pixel, so these moves never conflict.
+
+        Returns:
+            np.ndarray: The boolean mask of the grains (in source_rows) that moved.
+        """
+
+        targets = np.zeros_like(movers)
+        moved = np.zeros_like(movers)
+
+        if direction == 1:
+            targets[:, 1:] = movers[:, :-1]
+            targets &= below_rows == 0
+            moved[:, :-1] = targets[:, 1:]
+        else:
+            targets[:, :-1] = movers[:, 1:]
+            targets &= below_rows == 0
+            moved[:, 1:] = targets[:, :-1]
+
+        # Shifting within a row keeps the row-major order, so the n-th target matches the n-th mover
+        below_rows[targets] = source_rows[moved]
+        source_rows[moved] = 0
+
+        return moved
+
+    def step(self, sand_pile) -> int:
+        """
+        Runs one physics step on the row set selected by sand_pile.odd_rows.
+
+        Returns:
+            int: The number of grains that moved.
+        """
+
+        grid = self.grid_2d
+        rows = self._row_sets[sand_pile.odd_rows]
+        if len(rows) == 0:
+            return 0
+
+        # Fancy indexing copies the rows; they are written back at the end.
+        # `rows` and `rows + 1` never overlap because the rows are two apart.
+        source_rows = grid[rows]
+        below_rows = grid[rows + 1]
+
+        # --- STEP 1) STRAIGHT FALLS ---
+        falls = (source_rows != 0) & (below_rows == 0)
+        below_rows[falls] = source_rows[falls]
+        source_rows[falls] = 0
+        num_moved = int(np.count_nonzero(falls))
+
+        grid[rows] = source_rows
+        grid[rows + 1] = below_rows
+
+        # --- STEP 2) DIAGONAL FALLS ---
+
+        # Every grain that is still in a source row is blocked below. It only slides if the pixel
+        # two rows down is occupied (or is past the floor); otherwise it would use a "floating" pivot.
+        pivot_rows = rows + 2
+        has_pivot_row = pivot_rows < constants.PLAYFIELD_HEIGHT
+        floating = np.zeros(source_rows.shape, dtype=bool)
+        floating[has_pivot_row] = grid[pivot_rows[has_pivot_row]] == 0
+
+        candidates = (source_rows != 0) & ~floating
+        prefers_right = self._rng.integers(0, 2, size=candidates.shape, dtype=np.uint8).astype(bool)
+        right_first = candidates & prefers_right
+        left_first = candidates & ~prefers_right
+
+        moved_right = self._try_diagonal(source_rows, below_rows, right_first, 1)
+        moved_left = self._try_diagonal(source_rows, below_rows, left_first, -1)
+
+        # If the first diagonal fails, the grain tries the other diagonal
+        moved_right_fallback = self._try_diagonal(source_rows, below_rows, right_first & ~moved_right, -1)
+        moved_left_fallback = self._try_diagonal(source_rows, below_rows, left_first & ~moved_left, 1)
+
+        num_moved += int(
+            np.count_nonzero(moved_right) + np.count_nonzero(moved_left)
+            + np.count_nonzero(moved_right_fallback) + np.count_nonzero(moved_left_fallback)
+        )
+
+        grid[rows] = source_rows
+        grid[rows + 1] = below_rows
+
+        # --- OCCUPANCY BITBOARD ---
+        # Rebuild every row mask at once: pack each row's 32 occupied flags into one little-endian uint32
+        if num_moved:
+            packed_rows = np.packbits(grid != 0, axis=1, bitorder="little").view("<u4")[:, 0]
+            row_masks = sand_pile.row_masks
+            for y, mask in enumerate(packed_rows.tolist()):
+                row_masks[y] = mask
+
+        # --- SLEEP ---
+        # Once neither the even nor the odd rows moved, the pile is settled.
+        if num_moved:
+            self._quiet_steps = 0
+        else:
+            self._quiet_steps += 1
+            if self._quiet_steps >= 2:
+                sand_pile._deactivate_all_pixels()
+                self._quiet_steps = 0  # the next activation needs two more settled steps
+
+        return num_moved
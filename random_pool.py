@@ -0,0 +1,93 @@
+# random_pool.py
+
+import random
+
+import constants
+
+
+class RandomBitPool:
+    """
+    A seeded source of random bits for the whole game. Instead of calling into the random module once per
+    decision (random.getrandbits(1) per sliding grain, random.choice per spawn), it refills a bytearray of
+    random bits in bulk and hands them out by index.
+
+    Given the same seed, the sand and the piece sequence are the same every run, which is what
+    benchmarks and replays need. Where the random module has random.Random (CPython, for headless runs and
+    benchmarks), every pool has a generator of its own, so several pools do not disturb each other.
+    CircuitPython only has the module-level generator: there, all the pools in a process share one stream,
+    and seeding one reseeds them all.
+
+    Hot loops can read the pool directly instead of calling next_bit() for every bit:
+
+        if bit_index >= pool.num_bits:
+            pool.refill()
+            bit_index = 0
+        bit = (pool.bits[bit_index >> 3] >> (bit_index & 7)) & 1
+        bit_index += 1
+        ...
+        pool.bit_index = bit_index
+    """
+
+    def __init__(self, seed: int = constants.RANDOM_SEED, size: int = constants.RANDOM_POOL_SIZE):
+        """
+        Args:
+            seed (int): The seed, or None for an unseeded generator (or, on CircuitPython, to keep the random module's own seed).
+            size (int): The number of random bytes generated per refill.
+        """
+        self.bits = bytearray(size)
+        self.num_bits = size * 8
+        self.bit_index = self.num_bits  # empty; the first bit triggers a refill
+        self.num_refills = 0
+        self._random = random.Random(seed) if hasattr(random, "Random") else random
+
+        if seed is not None:
+            self.seed(seed)
+
+    def seed(self, seed: int):
+        """ Reseeds the pool and throws away the bits that were generated with the old seed. """
+        self._random.seed(seed)
+        self.bit_index = self.num_bits
+
+    def refill(self):
+        """ Generates a whole pool of new random bits. """
+        bits = self.bits
+        getrandbits = self._random.getrandbits
+        for i in range(len(bits)):
+            bits[i] = getrandbits(8)
+        self.bit_index = 0
+        self.num_refills += 1
+
+    def next_bit(self) -> int:
+        """ Returns 0 or 1. """
+        if self.bit_index >= self.num_bits:
+            self.refill()
+        bit_index = self.bit_index
+        self.bit_index = bit_index + 1
+        return (self.bits[bit_index >> 3] >> (bit_index & 7)) & 1
+
+    def next_bits(self, count: int) -> int:
+        """ Returns an integer made of `count` random bits. """
+        value = 0
+        for _ in range(count):
+            value = (value << 1) | self.next_bit()
+        return value
+
+    def randbelow(self, limit: int) -> int:
+        """ Returns a uniformly distributed integer in [0, limit). """
+        num_bits = 0
+        while (1 << num_bits) < limit:
+            num_bits += 1
+
+        # Rejection sampling keeps every value equally likely
+        while True:
+            value = self.next_bits(num_bits)
+            if value < limit:
+                return value
+
+    def choice(self, sequence):
+        """ Returns a random element of a non-empty sequence, like random.choice(). """
+        return sequence[self.randbelow(len(sequence))]
+
+    def random(self) -> float:
+        """ Returns a float in [0.0, 1.0) with 16 bits of precision, like random.random(). """
+        return self.next_bits(16) / 65536
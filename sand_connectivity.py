@@ -0,0 +1,179 @@
+# sand_connectivity.py
+
+from array import array
+
+import constants
+
+# The grain color of every palette index: each color has two shades in the sprite sheet (1-2 blue, 3-4 red,
+# 5-6 green, 7-8 yellow), and white (9) is a color of its own. The flash index (and empty, 0) has no color:
+# grains that are being cleared are never registered.
+_NO_COLOR = 0xFF
+_COLOR_OF_VALUE = bytes(
+    (value - 1) >> 1 if 0 < value < constants.SAND_FLASH_INDEX else _NO_COLOR
+    for value in range(16)
+)
+
+_LEFT_WALL = 1
+_RIGHT_WALL = 2
+_BOTH_WALLS = _LEFT_WALL | _RIGHT_WALL
+
+# The (dx, dy) offsets of the 8 neighbors of a grain
+_NEIGHBOR_OFFSETS = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+
+class SandConnectivity:
+    """
+    An incremental union-find over the settled grains of the SandPile. Grains of the same color that touch
+    (8-connected, so diagonal steps count) are in the same component, and every component's root knows
+    whether it touches the left wall, the right wall or both. A component that touches both walls is a
+    same-color path from left to right, which SandPile.find_and_clear_lines clears.
+
+    Adding a grain is a few unions, so components are kept up to date as grains settle instead of flood
+    filling the whole grid on every landing. A union-find cannot remove single grains, though. Grains
+    are only registered once they are settled (their tile and the tiles beside and under it are asleep,
+    see SandPile._register_settled_tiles), and a settled grain only moves when something under it is cleared. When that happens, the whole structure
+    is reset and the grains of the sleeping tiles are registered again (see has_departures).
+
+    Memory: 1888 cells * (2 + 2 + 1) bytes + the 59 registered row masks = about 9.7 KB.
+    """
+
+    def __init__(self):
+        num_cells = constants.GAME_WIDTH * constants.PLAYFIELD_HEIGHT
+        self.parent = array("H", [0] * num_cells)
+        self.size = array("H", [0] * num_cells)
+        self.walls = bytearray(num_cells)  # only meaningful for roots
+
+        # Bit x of registered_rows[y] is set when the grain at (x, y) is in the structure
+        self.registered_rows = array("L", [0] * constants.PLAYFIELD_HEIGHT)
+
+        # Roots that touched both walls when they were created. They may have been merged into another
+        # root since, so they are looked up again in take_spanning_components.
+        self._spanning_roots = []
+
+        self.num_resets = 0
+
+    def reset(self):
+        """ Forgets every grain. """
+        registered_rows = self.registered_rows
+        for y in range(constants.PLAYFIELD_HEIGHT):
+            registered_rows[y] = 0
+        self._spanning_roots = []
+        self.num_resets += 1
+
+    def _find(self, index: int) -> int:
+        parent = self.parent
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]  # path halving keeps the trees flat
+            index = parent[index]
+        return index
+
+    def _union(self, first: int, second: int):
+        first_root = self._find(first)
+        second_root = self._find(second)
+        if first_root == second_root:
+            return
+
+        # Attach the smaller tree under the larger one
+        if self.size[first_root] < self.size[second_root]:
+            first_root, second_root = second_root, first_root
+        self.parent[second_root] = first_root
+        self.size[first_root] += self.size[second_root]
+
+        first_walls = self.walls[first_root]
+        second_walls = self.walls[second_root]
+        self.walls[first_root] = first_walls | second_walls
+
+        # A component that just started spanning (one that already spanned is on the list already)
+        if first_walls | second_walls == _BOTH_WALLS and first_walls != _BOTH_WALLS and second_walls != _BOTH_WALLS:
+            self._spanning_roots.append(first_root)
+
+    def _add(self, cells, x: int, y: int):
+        """ Adds the grain at (x, y) and joins it with its registered neighbors of the same color. """
+        grid_width = constants.GAME_WIDTH
+        index = y * grid_width + x
+        color = _COLOR_OF_VALUE[cells[index]]
+
+        self.parent[index] = index
+        self.size[index] = 1
+        walls = 0
+        if x == 0:
+            walls |= _LEFT_WALL
+        if x == grid_width - 1:
+            walls |= _RIGHT_WALL
+        self.walls[index] = walls
+        self.registered_rows[y] |= 1 << x
+
+        for dx, dy in _NEIGHBOR_OFFSETS:
+            neighbor_x = x + dx
+            neighbor_y = y + dy
+            if not (0 <= neighbor_x < grid_width and 0 <= neighbor_y < constants.PLAYFIELD_HEIGHT):
+                continue
+            if not (self.registered_rows[neighbor_y] >> neighbor_x) & 1:
+                continue
+            neighbor_index = neighbor_y * grid_width + neighbor_x
+            if _COLOR_OF_VALUE[cells[neighbor_index]] == color:
+                self._union(index, neighbor_index)
+
+    def register_rows(self, cells, row_masks, first_y: int, last_y: int, column_mask: int):
+        """
+        Registers every grain in rows [first_y, last_y) and the columns of column_mask that is not registered yet.
+        Grains that are being cleared (the flash index) are left out.
+        """
+        registered_rows = self.registered_rows
+        for y in range(first_y, last_y):
+            new_grains = row_masks[y] & column_mask & ~registered_rows[y]
+            x = 0
+            row_start = y * constants.GAME_WIDTH
+            while new_grains:
+                if new_grains & 1 and _COLOR_OF_VALUE[cells[row_start + x]] != _NO_COLOR:
+                    self._add(cells, x, y)
+                new_grains >>= 1
+                x += 1
+
+    def has_departures(self, row_masks) -> bool:
+        """ Returns whether a registered grain has left its cell since it was registered. """
+        registered_rows = self.registered_rows
+        for y in range(constants.PLAYFIELD_HEIGHT):
+            if registered_rows[y] & ~row_masks[y]:
+                return True
+        return False
+
+    def has_spanning_component(self) -> bool:
+        return len(self._spanning_roots) > 0
+
+    def take_spanning_components(self, cells):
+        """
+        Removes the components that touch both walls from the structure and returns their cells.
+        The other components are not affected, since no other grain was ever joined to them.
+
+        Returns:
+            list: The flat indices of the grains to clear, or None if a registered grain changed color since
+            it was registered (the structure is stale and must be reset).
+        """
+        roots = []
+        for root in self._spanning_roots:
+            root = self._find(root)
+            if self.walls[root] == _BOTH_WALLS and root not in roots:
+                roots.append(root)
+        self._spanning_roots = []
+
+        grid_width = constants.GAME_WIDTH
+        registered_rows = self.registered_rows
+        members = []
+        for y in range(constants.PLAYFIELD_HEIGHT):
+            registered = registered_rows[y]
+            x = 0
+            while registered:
+                if registered & 1:
+                    index = y * grid_width + x
+                    root = self._find(index)
+                    if root in roots:
+                        if cells[index] == 0 or _COLOR_OF_VALUE[cells[index]] != _COLOR_OF_VALUE[cells[root]]:
+                            return None
+                        members.append(index)
+                registered >>= 1
+                x += 1
+
+        for index in members:
+            registered_rows[index // grid_width] &= ~(1 << (index % grid_width))
+        return members
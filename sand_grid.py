@@ -0,0 +1,215 @@
+# sand_grid.py
+
+import constants
+
+try:
+    import bitmaptools  # CircuitPython only
+except ImportError:
+    bitmaptools = None
+
+try:
+    import numpy as np  # desktop runs
+except ImportError:
+    try:
+        from ulab import numpy as np  # CircuitPython builds that ship ulab
+    except ImportError:
+        np = None
+
+
+def _stamp_runs(cells, width: int, stamp, x: int, y: int, first_row: int, last_row: int):
+    """
+    Copies rows [first_row, last_row) of a stamp_cache.PieceStamp onto flat cells that support slice
+    assignment (bytearray, NumPy), with the stamp's top-left corner at (x, y). Each run of sand pixels
+    is a single slice copy, so empty pixels never overwrite sand. Columns outside the grid are clipped.
+    """
+    pixels = stamp.pixels
+    stamp_width = stamp.width
+
+    for row in range(first_row, last_row):
+        dest_row_start = (y + row) * width + x
+        source_row_start = row * stamp_width
+
+        for start, end in stamp.row_runs[row]:
+            if x + start < 0:
+                start = -x
+            if x + end > width:
+                end = width - x
+            if start < end:
+                cells[dest_row_start + start:dest_row_start + end] = pixels[source_row_start + start:source_row_start + end]
+
+
+class BitmapGrid:
+    """
+    Grid storage that uses the SandPileView bitmap directly. This is the original behavior:
+    the bitmap is the single source of truth, so every write is immediately visible on the display.
+
+    displayio.Bitmap supports flat indexing (bitmap[x + y * width]), which avoids building an
+    (x, y) tuple for every read in the physics loop.
+    """
+
+    def __init__(self, bitmap):
+        self.cells = bitmap
+        self.width = constants.GAME_WIDTH
+        self.height = constants.PLAYFIELD_HEIGHT
+
+    def get(self, x: int, y: int) -> int:
+        return self.cells[y * self.width + x]
+
+    def set(self, x: int, y: int, value: int):
+        self.cells[y * self.width + x] = value
+
+    def fill(self, value: int):
+        self.cells.fill(value)
+
+    def commit(self, first_y: int, last_y: int):
+        """ Nothing to do: every write is already on the bitmap. """
+        pass
+
+    def stamp(self, stamp, x: int, y: int, first_row: int, last_row: int):
+        """
+        Copies rows [first_row, last_row) of a stamp_cache.PieceStamp with its top-left corner at (x, y),
+        skipping empty stamp pixels. On the board this is a single bitmaptools.arrayblit call.
+        """
+        if bitmaptools is not None and x >= 0 and x + stamp.width <= self.width:
+            bitmaptools.arrayblit(
+                self.cells,
+                stamp.pixels[first_row * stamp.width:last_row * stamp.width],
+                x, y + first_row, x + stamp.width, y + last_row,
+                skip_index=0,  # empty stamp pixels leave the sand underneath alone
+            )
+            return
+
+        # Without bitmaptools (or when clipped at a wall), fall back to copying the runs pixel by pixel
+        cells = self.cells
+        for row in range(first_row, last_row):
+            dest_row_start = (y + row) * self.width + x
+            source_row_start = row * stamp.width
+            for start, end in stamp.row_runs[row]:
+                for column in range(max(start, -x), min(end, self.width - x)):
+                    cells[dest_row_start + column] = stamp.pixels[source_row_start + column]
+
+
+class BytearrayGrid:
+    """
+    Grid storage backed by a flat bytearray of GAME_WIDTH * PLAYFIELD_HEIGHT bytes (1888 bytes).
+    Indexing a bytearray is much cheaper than going through the Bitmap subscript protocol,
+    but nothing written here reaches the display on its own.
+    """
+
+    def __init__(self):
+        self.width = constants.GAME_WIDTH
+        self.height = constants.PLAYFIELD_HEIGHT
+        self.cells = bytearray(self.width * self.height)
+
+    def get(self, x: int, y: int) -> int:
+        return self.cells[y * self.width + x]
+
+    def set(self, x: int, y: int, value: int):
+        self.cells[y * self.width + x] = value
+
+    def fill(self, value: int):
+        self.cells[:] = bytes((value,)) * len(self.cells)
+
+    def commit(self, first_y: int, last_y: int):
+        """ Nothing to do: there is no display to copy to. """
+        pass
+
+    def stamp(self, stamp, x: int, y: int, first_row: int, last_row: int):
+        """ Copies rows [first_row, last_row) of a stamp_cache.PieceStamp with its top-left corner at (x, y). """
+        _stamp_runs(self.cells, self.width, stamp, x, y, first_row, last_row)
+
+
+class ShadowGrid(BytearrayGrid):
+    """
+    Grid storage that simulates in a flat bytearray (see BytearrayGrid) and keeps the SandPileView bitmap as
+    a display copy. The physics never touches the bitmap; commit() copies the rows that changed to it in one
+    bulk operation, so the display only sees the sand once per render instead of on every write, and marks
+    one dirty region instead of one per write.
+    """
+
+    def __init__(self, bitmap):
+        super().__init__()
+        self.bitmap = bitmap
+        self.num_commits = 0
+        self.num_committed_rows = 0
+
+    def commit(self, first_y: int, last_y: int):
+        """ Copies rows [first_y, last_y] to the bitmap. On the board this is a single bitmaptools.arrayblit call. """
+        start = first_y * self.width
+        end = (last_y + 1) * self.width
+
+        if bitmaptools is not None:
+            bitmaptools.arrayblit(self.bitmap, memoryview(self.cells)[start:end], 0, first_y, self.width, last_y + 1)
+        else:
+            bitmap = self.bitmap
+            cells = self.cells
+            for index in range(start, end):
+                bitmap[index] = cells[index]
+
+        self.num_commits += 1
+        self.num_committed_rows += last_y - first_y + 1
+
+
+class NumpyGrid:
+    """
+    Grid storage backed by a flat NumPy uint8 array. Per-cell access is slower than a bytearray,
+    but as_2d() gives a (row, column) view that whole-board engines can work on directly.
+    Meant for desktop runs (soak tests, benchmarks).
+    """
+
+    def __init__(self):
+        if np is None:
+            raise ImportError("The NUMPY grid backend requires numpy (or ulab.numpy)")
+
+        self.width = constants.GAME_WIDTH
+        self.height = constants.PLAYFIELD_HEIGHT
+        self.cells = np.zeros(self.width * self.height, dtype=np.uint8)
+
+    def get(self, x: int, y: int) -> int:
+        return int(self.cells[y * self.width + x])
+
+    def set(self, x: int, y: int, value: int):
+        self.cells[y * self.width + x] = value
+
+    def fill(self, value: int):
+        self.cells[:] = value
+
+    def commit(self, first_y: int, last_y: int):
+        """ Nothing to do: there is no display to copy to. """
+        pass
+
+    def stamp(self, stamp, x: int, y: int, first_row: int, last_row: int):
+        """ Copies rows [first_row, last_row) of a stamp_cache.PieceStamp with its top-left corner at (x, y). """
+        _stamp_runs(self.cells, self.width, stamp, x, y, first_row, last_row)
+
+    def as_2d(self):
+        """ Returns a (PLAYFIELD_HEIGHT, GAME_WIDTH) view that shares memory with the flat cells. """
+        return self.cells.reshape((self.height, self.width))
+
+
+def create_grid(backend: int, bitmap=None):
+    """
+    Creates the grid storage for a SandPile.
+
+    Args:
+        backend (constants.GridBackend): Which storage to use.
+        bitmap (displayio.Bitmap): The SandPileView bitmap. Only required for GridBackend.BITMAP and SHADOW.
+    """
+
+    if backend == constants.GridBackend.BITMAP:
+        if bitmap is None:
+            raise ValueError("The BITMAP grid backend needs the sand bitmap")
+        return BitmapGrid(bitmap)
+
+    if backend == constants.GridBackend.BYTEARRAY:
+        return BytearrayGrid()
+
+    if backend == constants.GridBackend.NUMPY:
+        return NumpyGrid()
+
+    if backend == constants.GridBackend.SHADOW:
+        if bitmap is None:
+            raise ValueError("The SHADOW grid backend needs the sand bitmap")
+        return ShadowGrid(bitmap)
+
+    raise ValueError("Unknown grid backend: {}".format(backend))
@@ -1,12 +1,49 @@
 # sand_pile.py
 
-import displayio
-import random
+from __future__ import annotations
+
+from array import array
 import time
 
 from tetromino import Tetromino
+from sand_grid import create_grid
+from stamp_cache import StampCache
+from margolus_sand_engine import MargolusSandEngine
+from random_pool import RandomBitPool
+from sand_connectivity import SandConnectivity
 import constants
 
+try:
+    from typing import Tuple
+    import displayio
+except ImportError:
+    pass
+
+# --- Sleeping Tile Lookup Tables ---
+# For every column x, the tile-column bit of the tile that contains x
+_TILE_BIT_OF_COLUMN = bytes(1 << (x >> constants.SAND_TILE_SHIFT) for x in range(constants.GAME_WIDTH))
+_TILE_PIXEL_MASK = (1 << constants.SAND_TILE_SIZE) - 1  # the columns of tile column 0
+
+
+def _tile_bits_of_columns(column_mask: int) -> int:
+    """ Converts a row's column mask into the bits of the tile columns that it touches. """
+    tile_bits = 0
+    tile_column = 0
+    while column_mask:
+        if column_mask & _TILE_PIXEL_MASK:
+            tile_bits |= 1 << tile_column
+        column_mask >>= constants.SAND_TILE_SIZE
+        tile_column += 1
+    return tile_bits
+
+def _columns_of_tile_bits(tile_bits: int) -> int:
+    """ Converts tile-column bits into the column mask of the pixels they cover. """
+    column_mask = 0
+    for tile_column in range(constants.SAND_TILE_COLUMNS):
+        if (tile_bits >> tile_column) & 1:
+            column_mask |= _TILE_PIXEL_MASK << (tile_column * constants.SAND_TILE_SIZE)
+    return column_mask
+
 class SandPile:
     """
     This is a model class that manages the logic of the playfield (sandpile).
@@ -16,9 +53,19 @@ class SandPile:
         it will cost us 59 (Game Area Height) * 32 (Game Area Width) * 4 (bytes per int) = 7552 bytes which is around 4% of our
         available RAM.
     Instead, we are going to use the bitmap as the single source of truth.
+
+    The storage itself is pluggable (see sand_grid.py). By default it is the bitmap, but a flat bytearray
+    or a NumPy array can be used instead for headless runs and benchmarks. Every backend is indexed the
+    same way, with a flat index (y * GAME_WIDTH + x), so the physics code does not care which one it runs on.
     """
 
-    def __init__(self, sand_bitmap: displayio.Bitmap):
+    def __init__(
+        self,
+        sand_bitmap: displayio.Bitmap,
+        backend: int = constants.SAND_GRID_BACKEND,
+        engine: int = constants.SAND_ENGINE,
+        random_bits: RandomBitPool = None,
+    ):
         """
         Initializes SandPile class.
 
@@ -27,20 +74,375 @@ class SandPile:
             single data source for all of its logic. Otherwise, we would have had to create another 2D array with
             MATRIX WIDTH * MATRIX HEIGHT values which is extremely expensive. It is a pragmatic decision to let the SandPile
             model have access to the view.
+            backend (constants.GridBackend): Where the sand is stored. GridBackend.BITMAP is drawn to the display
+            as it is written, and GridBackend.SHADOW whenever commit_dirty_rows is called; the other backends are
+            for headless runs and benchmarks, and sand_bitmap may be None.
+            engine (constants.SandEngine): Which sand physics engine apply_sand_physics runs.
+            random_bits (RandomBitPool): Where the sand's random decisions come from. Pass the Game's pool so that
+            one seed reproduces the whole game; by default the SandPile creates its own.
 
         """
 
         self.sand_state_bitmap = sand_bitmap
-        # A list of sets. Each index in the list corresponds to a Y-row.
-        # The set at that index contains all active X-coordinates for that row.
-        self.active_rows = [set() for _ in range(constants.PLAYFIELD_HEIGHT)]
+        self.grid = create_grid(backend, sand_bitmap)
+        self.random_bits = random_bits if random_bits is not None else RandomBitPool()
+        # The active pixel set, as one bitmask per Y-row: bit x of active_rows[y] is set when (x, y)
+        # must be checked by the next physics step. Unlike a list of Python sets, this never grows or
+        # shrinks, so activating and deactivating pixels does not churn the heap (59 * 4 = 236 bytes).
+        self.active_rows = array("L", [0] * constants.PLAYFIELD_HEIGHT)
+        # The row-level summary: bit y is set when active_rows[y] has any active pixel.
+        # (At 59 bits this is a long int in CircuitPython, but it saves visiting 59 rows to find the active ones.)
+        self.active_row_summary = 0
         self.odd_rows = False
+        # The row that a budgeted physics step ran out of budget at resumes from, or None (see apply_sand_physics)
+        self._resume_y = None
+
+        # The sleeping tiles (see constants.SAND_TILE_SIZE). awake_tiles[tile_row] has one bit per tile column.
+        # A tile is awake while it has active sand, and falls asleep after SAND_TILE_SLEEP_STEPS steps without
+        # any; its grains are then settled (see _update_sleeping_tiles). The physics step itself only looks at
+        # the active pixels, which already leave out every sleeping tile.
+        self.awake_tiles = bytearray(constants.SAND_TILE_ROWS)
+        self._tile_quiet_steps = bytearray(constants.SAND_TILE_ROWS * constants.SAND_TILE_COLUMNS)
+        # The sleeping tiles whose grains are not in the connectivity structure yet, since a tile next to or
+        # under them is still awake and may pull their grains away (see _register_settled_tiles)
+        self._unregistered_tiles = bytearray(constants.SAND_TILE_ROWS)
+
+        # The occupancy bitboard. GAME_WIDTH is 32, so each playfield row fits in one 32-bit mask:
+        # bit x of row_masks[y] is set when there is sand at (x, y). It is kept in sync with the grid
+        # so that row-level questions are a single bitwise operation instead of 32 grid reads.
+        # 59 rows * 4 bytes = 236 bytes.
+        self.row_masks = array("L", [0] * constants.PLAYFIELD_HEIGHT)
+
+        # The skyline: the height of the topmost grain of every column (0 for an empty column, PLAYFIELD_HEIGHT
+        # for a column with sand in the top row), for landing predictions, game-over checks and stats.
+        # A grain only moves down by one row, so a move updates it in O(1); only clears recompute it.
+        # Read it through column_heights, a read-only view (32 bytes).
+        self._column_heights = bytearray(constants.GAME_WIDTH)
+        try:
+            self.column_heights = memoryview(self._column_heights).toreadonly()
+        except AttributeError:
+            # CircuitPython's memoryview has no toreadonly; treat it as read-only all the same
+            self.column_heights = memoryview(self._column_heights)
+
+        # The generation counters: band_generations[tile_row] goes up whenever the occupancy of a row in that
+        # band of SAND_TILE_SIZE rows changes, so that answers about the sand (e.g. a collision) can be reused
+        # until the rows they looked at change (see get_generation).
+        self.band_generations = array("L", [0] * constants.SAND_TILE_ROWS)
+
+        # The span of rows [_dirty_first_y, _dirty_last_y] that changed since the last commit_dirty_rows
+        # (empty when first > last). With GridBackend.SHADOW only these rows are copied to the display.
+        self._dirty_first_y = constants.PLAYFIELD_HEIGHT
+        self._dirty_last_y = -1
+
+        # Pre-rendered pieces for transform_and_activate_tetromino_to_sand
+        self._stamp_cache = StampCache()
+
+        # The same-color components of the settled sand, for find_and_clear_lines. Grains are added
+        # once their tile and the tiles around it are asleep (see _register_settled_tiles).
+        self.connectivity = SandConnectivity()
+
+        # The alternative physics engine, or None for the reference engine in apply_sand_physics
+        if engine == constants.SandEngine.REFERENCE:
+            self._engine = None
+        elif engine == constants.SandEngine.NUMPY:
+            from numpy_sand_engine import NumpySandEngine  # imported here since NumPy only exists on desktop
+            self._engine = NumpySandEngine(self.grid, self.random_bits)
+        elif engine == constants.SandEngine.MARGOLUS:
+            self._engine = MargolusSandEngine(self.grid)
+        else:
+            raise ValueError("Unknown sand engine: {}".format(engine))
 
     def _activate_pixel(self, coord: Tuple[int, int]):
         """A helper method to add a pixel to the active list, with boundary checks."""
         x, y = coord
         if 0 <= y < constants.PLAYFIELD_HEIGHT and 0 <= x < constants.GAME_WIDTH:
-            self.active_rows[y].add(x)
+            self.active_rows[y] |= 1 << x
+            self.active_row_summary |= 1 << y
+            self._wake_tiles(y, _TILE_BIT_OF_COLUMN[x])
+
+    def _wake_tiles(self, y: int, tile_bits: int):
+        """ Wakes the tiles (given as tile-column bits) in the band of rows that contains row y. """
+        tile_row = y >> constants.SAND_TILE_SHIFT
+        self.awake_tiles[tile_row] |= tile_bits
+        self._unregistered_tiles[tile_row] &= ~tile_bits
+
+        first_tile = tile_row * constants.SAND_TILE_COLUMNS
+        for tile_column in range(constants.SAND_TILE_COLUMNS):
+            if (tile_bits >> tile_column) & 1:
+                self._tile_quiet_steps[first_tile + tile_column] = 0
+
+    def _update_sleeping_tiles(self):
+        """
+        Called after every physics step. Tiles with active sand are awake (the physics step only marks pixels
+        active; their tiles are woken here, once per step); the others count one more quiet step and fall
+        asleep after SAND_TILE_SLEEP_STEPS of them. The grains of a tile that falls asleep are settled once
+        its neighbors are asleep too (see _register_settled_tiles).
+        """
+        active_rows = self.active_rows
+        active_row_summary = self.active_row_summary
+        quiet_steps = self._tile_quiet_steps
+        unregistered_tiles = self._unregistered_tiles
+        band_rows = (1 << constants.SAND_TILE_SIZE) - 1
+
+        for tile_row in range(constants.SAND_TILE_ROWS):
+            band_top = tile_row << constants.SAND_TILE_SHIFT
+            band_active = 0
+            if (active_row_summary >> band_top) & band_rows:
+                for y in range(band_top, min(band_top + constants.SAND_TILE_SIZE, constants.PLAYFIELD_HEIGHT)):
+                    band_active |= active_rows[y]
+            busy = _tile_bits_of_columns(band_active)
+
+            awake = self.awake_tiles[tile_row] | busy
+            if not awake:
+                continue
+
+            first_tile = tile_row * constants.SAND_TILE_COLUMNS
+            fell_asleep = 0
+            for tile_column in range(constants.SAND_TILE_COLUMNS):
+                tile_bit = 1 << tile_column
+                if not awake & tile_bit:
+                    continue
+
+                if busy & tile_bit:
+                    quiet_steps[first_tile + tile_column] = 0
+                    continue
+
+                quiet_steps[first_tile + tile_column] += 1
+                if quiet_steps[first_tile + tile_column] >= constants.SAND_TILE_SLEEP_STEPS:
+                    awake &= ~tile_bit
+                    fell_asleep |= tile_bit
+
+            self.awake_tiles[tile_row] = awake
+            unregistered_tiles[tile_row] = (unregistered_tiles[tile_row] & ~busy) | fell_asleep
+
+        self._register_settled_tiles()
+
+    def _register_settled_tiles(self):
+        """
+        Adds the grains of the sleeping tiles that are settled to the connectivity structure. A grain on the
+        edge of a tile rests on (or next to) the grains of the tiles beside and under it, so while one of
+        those is awake, a grain in it can still move away and let this tile's grains slide after it. Such a
+        tile waits until they are all asleep; otherwise its registered grains would leave their cells, and
+        find_lines would have to rebuild the whole structure.
+        """
+        awake_tiles = self.awake_tiles
+        unregistered_tiles = self._unregistered_tiles
+
+        for tile_row in range(constants.SAND_TILE_ROWS - 1, -1, -1):
+            unregistered = unregistered_tiles[tile_row]
+            if not unregistered:
+                continue
+
+            awake = awake_tiles[tile_row]
+            blocked = (awake << 1) | (awake >> 1)
+            if tile_row + 1 < constants.SAND_TILE_ROWS:
+                below = awake_tiles[tile_row + 1] | unregistered_tiles[tile_row + 1]
+                blocked |= (below << 1) | below | (below >> 1)
+
+            settled = unregistered & ~blocked
+            if settled:
+                unregistered_tiles[tile_row] = unregistered & ~settled
+                self._register_tiles(tile_row, settled)
+
+    def _register_tiles(self, tile_row: int, tile_bits: int):
+        """ Adds the grains of the given tiles (tile-column bits) in band tile_row to the connectivity structure. """
+        band_top = tile_row << constants.SAND_TILE_SHIFT
+        self.connectivity.register_rows(
+            self.grid.cells, self.row_masks,
+            band_top, min(band_top + constants.SAND_TILE_SIZE, constants.PLAYFIELD_HEIGHT),
+            _columns_of_tile_bits(tile_bits),
+        )
+
+    def get_active_pixel_count(self) -> int:
+        """ Returns how many pixels are in the active set, for profiling. """
+        count = 0
+        for active_mask in self.active_rows:
+            if active_mask:
+                count += bin(active_mask).count("1")
+        return count
+
+    def get_awake_tile_count(self) -> int:
+        """ Returns how many tiles are awake, for profiling. """
+        count = 0
+        for awake in self.awake_tiles:
+            while awake:
+                count += awake & 1
+                awake >>= 1
+        return count
+
+    def _deactivate_all_pixels(self):
+        """ Empties the active pixel set, e.g. once an engine knows that the whole pile is settled. """
+        active_rows = self.active_rows
+        for y in range(constants.PLAYFIELD_HEIGHT):
+            active_rows[y] = 0
+        self.active_row_summary = 0
+
+        for tile_row in range(constants.SAND_TILE_ROWS):
+            self.awake_tiles[tile_row] = 0
+            self._unregistered_tiles[tile_row] = 0
+
+        # Everything is settled now
+        self.connectivity.register_rows(
+            self.grid.cells, self.row_masks, 0, constants.PLAYFIELD_HEIGHT, constants.FULL_ROW_MASK,
+        )
+
+    def _sleep_awake_tiles(self):
+        """
+        Once no pixel is active at all, the tiles that are still counting quiet steps can sleep right away
+        (any activation wakes them again), and their grains are settled, as are those of the tiles that
+        were waiting for them.
+        """
+        for tile_row in range(constants.SAND_TILE_ROWS):
+            unsettled = self.awake_tiles[tile_row] | self._unregistered_tiles[tile_row]
+            if unsettled:
+                self.awake_tiles[tile_row] = 0
+                self._unregistered_tiles[tile_row] = 0
+                self._register_tiles(tile_row, unsettled)
+
+    def _register_sleeping_tiles(self):
+        """
+        Adds the grains of the sleeping tiles to the connectivity structure after it was reset, with the same
+        rule as when they fell asleep: the ones next to an awake tile wait (see _register_settled_tiles).
+        """
+        all_tiles = (1 << constants.SAND_TILE_COLUMNS) - 1
+        for tile_row in range(constants.SAND_TILE_ROWS):
+            self._unregistered_tiles[tile_row] = ~self.awake_tiles[tile_row] & all_tiles
+        self._register_settled_tiles()
+
+    # --- Generation Counters ---
+
+    def get_generation(self, y: int, num_rows: int) -> int:
+        """
+        Returns the generation of rows [y, y + num_rows): a number that goes up whenever the occupancy of one
+        of those rows changes (rows outside the playfield never change). It is the sum of the generations of
+        the bands they touch, so only compare it with earlier generations of the same rows.
+        """
+        first_y = max(y, 0)
+        last_y = min(y + num_rows, constants.PLAYFIELD_HEIGHT) - 1
+        generation = 0
+        for tile_row in range(first_y >> constants.SAND_TILE_SHIFT, (last_y >> constants.SAND_TILE_SHIFT) + 1):
+            generation += self.band_generations[tile_row]
+        return generation
+
+    def _bump_generations(self, first_y: int, last_y: int):
+        """ Marks rows [first_y, last_y] as changed. """
+        for tile_row in range(first_y >> constants.SAND_TILE_SHIFT, (last_y >> constants.SAND_TILE_SHIFT) + 1):
+            self.band_generations[tile_row] += 1
+        self._mark_dirty(first_y, last_y)
+
+    # --- Display Commits ---
+
+    def _mark_dirty(self, first_y: int, last_y: int):
+        """ Adds rows [first_y, last_y] to the rows the next commit_dirty_rows copies. """
+        if first_y < self._dirty_first_y:
+            self._dirty_first_y = first_y
+        if last_y > self._dirty_last_y:
+            self._dirty_last_y = last_y
+
+    def commit_dirty_rows(self) -> int:
+        """
+        Copies the rows that changed since the last commit to the display, in one bulk operation (see
+        sand_grid.ShadowGrid). Only the SHADOW backend has anything to copy; the bitmap backend is always up to date.
+
+        Returns:
+            int: The number of rows that changed.
+        """
+        first_y = self._dirty_first_y
+        last_y = self._dirty_last_y
+        if first_y > last_y:
+            return 0
+
+        self.grid.commit(first_y, last_y)
+        self._dirty_first_y = constants.PLAYFIELD_HEIGHT
+        self._dirty_last_y = -1
+        return last_y - first_y + 1
+
+    # --- Column Skyline ---
+
+    def get_column_height(self, x: int) -> int:
+        """ Returns the height of the topmost grain of column x (0 when the column is empty). """
+        return self._column_heights[x]
+
+    def get_max_column_height(self) -> int:
+        """ Returns the height of the highest column. """
+        return max(self._column_heights)
+
+    def find_landing_y(self, geometry: constants.ShapeGeometry, x: int, y: int) -> int:
+        """
+        Returns the y at which a piece that falls straight down from playfield position (x, y) comes to rest,
+        in one pass over its columns: each of its pixel columns stops on top of the topmost grain of the sand
+        column under it (or on the floor), and the piece stops at the first column that does.
+
+        The skyline only knows the topmost grain, so a piece that is already below the top of a column
+        (under a floating grain) is stepped down row by row instead.
+
+        Args:
+            geometry (constants.ShapeGeometry): The piece's shape and orientation.
+            x, y (int): The playfield position of the piece's top-left corner (y may be negative while it is
+                still in the info bar).
+        """
+        column_heights = self._column_heights
+        bottom_profile = geometry.bottom_profile
+        landing_y = constants.PLAYFIELD_HEIGHT
+
+        for pixel_column in range(len(bottom_profile)):
+            profile = bottom_profile[pixel_column]
+            column = x + pixel_column
+            if profile and 0 <= column < constants.GAME_WIDTH:
+                column_landing_y = constants.PLAYFIELD_HEIGHT - column_heights[column] - profile
+                if column_landing_y < landing_y:
+                    landing_y = column_landing_y
+
+        if landing_y >= y:
+            return landing_y
+
+        bottom_y = constants.PLAYFIELD_HEIGHT - len(bottom_profile) + geometry.bottom_padding
+        while y < bottom_y and not self.overlaps_pixel_masks(geometry.pixel_masks, x, y + 1):
+            y += 1
+        return y
+
+    def _raise_column_heights(self, column_mask: int, y: int):
+        """ Raises the columns of column_mask to at least the height of row y, after grains were placed there. """
+        column_heights = self._column_heights
+        height = constants.PLAYFIELD_HEIGHT - y
+        x = 0
+        while column_mask:
+            if column_mask & 1 and column_heights[x] < height:
+                column_heights[x] = height
+            column_mask >>= 1
+            x += 1
+
+    def _lower_column_height(self, x: int, y: int):
+        """
+        Finds the new top of column x after its topmost grain left row y, looking down from there. A grain that
+        moved one row down (or slid off the grain under it) is found in the first row it looks at.
+        """
+        row_masks = self.row_masks
+        bit = 1 << x
+        for below_y in range(y, constants.PLAYFIELD_HEIGHT):
+            if row_masks[below_y] & bit:
+                self._column_heights[x] = constants.PLAYFIELD_HEIGHT - below_y
+                return
+        self._column_heights[x] = 0
+
+    def _recompute_column_heights(self):
+        """ Rebuilds the skyline from the row masks, top row first, e.g. after a clear. """
+        column_heights = self._column_heights
+        for x in range(constants.GAME_WIDTH):
+            column_heights[x] = 0
+
+        found = 0
+        for y in range(constants.PLAYFIELD_HEIGHT):
+            new_columns = self.row_masks[y] & ~found
+            if new_columns:
+                self._raise_column_heights(new_columns, y)
+                found |= new_columns
+                if found == constants.FULL_ROW_MASK:
+                    break
+
+    def has_active_pixels(self) -> bool:
+        """ Returns whether any pixel is still waiting to be checked by the sand physics. """
+        return self.active_row_summary != 0
 
     def _coord_within_bounds(self, coord: Tuple[int, int]):
         x, y = coord
@@ -62,8 +464,86 @@ class SandPile:
 
         x, y = coord
 
-        # Returns if pixel position is 0, which is our transparent index
-        return self.sand_state_bitmap[x, y] == 0
+        # Returns if the occupancy bit is clear (the pixel holds 0, which is our transparent index)
+        return not (self.row_masks[y] >> x) & 1
+
+    # --- Row Occupancy Queries ---
+
+    def get_row_mask(self, y: int) -> int:
+        """ Returns the occupancy mask of row y (bit x is set when (x, y) has sand). Out-of-bounds rows are empty. """
+        if 0 <= y < constants.PLAYFIELD_HEIGHT:
+            return self.row_masks[y]
+        return 0
+
+    def is_row_empty(self, y: int) -> bool:
+        return self.get_row_mask(y) == 0
+
+    def is_row_full(self, y: int) -> bool:
+        return self.get_row_mask(y) == constants.FULL_ROW_MASK
+
+    def get_free_columns_under(self, y: int) -> int:
+        """
+        Returns a mask of the columns that are free in the row directly under row y.
+        The floor counts as occupied, so nothing is free under the bottom row.
+        """
+        if y + 1 >= constants.PLAYFIELD_HEIGHT:
+            return 0
+        return ~self.get_row_mask(y + 1) & constants.FULL_ROW_MASK
+
+    def overlaps_pixel_masks(self, pixel_masks, x: int, y: int) -> bool:
+        """
+        Returns whether a piece overlaps any sand, given its pixel row masks (see constants.ShapeGeometry)
+        with its top-left corner at playfield position (x, y). Pixels outside the playfield never overlap,
+        the same way is_empty_at treats out-of-bounds pixels as empty.
+
+        This is one shift-and-AND per pixel row instead of one grid read per pixel.
+        """
+        row_masks = self.row_masks
+
+        # Only the mask rows that land inside the playfield can overlap anything
+        first_row = max(0, -y)
+        last_row = min(len(pixel_masks), constants.PLAYFIELD_HEIGHT - y)
+
+        for row_offset in range(first_row, last_row):
+            pixel_mask = pixel_masks[row_offset]
+            if x >= 0:
+                pixel_mask <<= x
+            else:
+                pixel_mask >>= -x  # pixels left of the wall are dropped (out of bounds)
+
+            if pixel_mask & row_masks[y + row_offset]:
+                return True
+
+        return False
+
+    def add_grain(self, coord: Tuple[int, int], value: int):
+        """ Places a single grain with palette index `value` at (x, y) and activates it. Used by benchmarks and tools. """
+        if (not self._coord_within_bounds(coord)):
+            raise IndexError
+
+        x, y = coord
+        self.grid.cells[y * constants.GAME_WIDTH + x] = value
+        if value:
+            self.row_masks[y] |= 1 << x
+            self._raise_column_heights(1 << x, y)
+        else:
+            self.row_masks[y] &= ~(1 << x)
+            self._recompute_column_heights()
+        self._bump_generations(y, y)
+        self._activate_pixel(coord)
+
+    def remove_grain(self, coord: Tuple[int, int]):
+        """ Removes the grain at (x, y), if any, and activates the three pixels above it, which may now fall. """
+        if (not self._coord_within_bounds(coord)):
+            raise IndexError
+
+        x, y = coord
+        self.grid.cells[y * constants.GAME_WIDTH + x] = 0
+        self.row_masks[y] &= ~(1 << x)
+        self._recompute_column_heights()
+        self._bump_generations(y, y)
+        for neighbor_x in (x - 1, x, x + 1):
+            self._activate_pixel((neighbor_x, y - 1))
 
     def _swap(self, coord1: Tuple[int, int], coord2: Tuple[int, int]):
         first_x, first_y = coord1
@@ -72,9 +552,27 @@ class SandPile:
         if (not self._coord_within_bounds(coord1) or not self._coord_within_bounds(coord2)):
             raise IndexError
 
-        temp = self.sand_state_bitmap[first_x, first_y]
-        self.sand_state_bitmap[first_x, first_y] = self.sand_state_bitmap[second_x, second_y]
-        self.sand_state_bitmap[second_x, second_y] = temp
+        cells = self.grid.cells
+        first_index = first_y * constants.GAME_WIDTH + first_x
+        second_index = second_y * constants.GAME_WIDTH + second_x
+
+        cells[first_index], cells[second_index] = cells[second_index], cells[first_index]
+
+        # Only when exactly one of the two pixels has sand do the occupancy bits change
+        row_masks = self.row_masks
+        if ((row_masks[first_y] >> first_x) & 1) != ((row_masks[second_y] >> second_x) & 1):
+            row_masks[first_y] ^= 1 << first_x
+            row_masks[second_y] ^= 1 << second_x
+
+            # The skyline, like the physics step: only the two columns change, and only their tops
+            if (row_masks[first_y] >> first_x) & 1:
+                to_x, to_y, from_x, from_y = first_x, first_y, second_x, second_y
+            else:
+                to_x, to_y, from_x, from_y = second_x, second_y, first_x, first_y
+            self._raise_column_heights(1 << to_x, to_y)
+            if self._column_heights[from_x] == constants.PLAYFIELD_HEIGHT - from_y:
+                self._lower_column_height(from_x, from_y)
+            self._bump_generations(min(first_y, second_y), max(first_y, second_y))
 
     def transform_and_activate_tetromino_to_sand(self, tetromino: Tetromino, sprite_sheet_bitmap: displayio.Bitmap):
         """
@@ -82,77 +580,78 @@ class SandPile:
         pragmatic decision based on the fact that our main 2D array is a bitmap (view).
         It also "activates" each of the pixel (adds it to the active_pixels list).
 
+        The piece is pre-rendered once into a PieceStamp (cached per shape, orientation and color), so placing it
+        is one clipped bulk copy onto the grid plus one bulk activation per row, instead of a pixel-by-pixel copy.
+
         Args:
             tetromino (Tetromino): The tetromino object to convert to sand.
-            sprite_sheet_bitmap
             sprite_sheet_bitmap (displayio.Bitmap): The spritesheet bitmap
-            that contains all sprites for minos. This is used to stamp
-            the colors and palettes into the sand_bitmap.
+            that contains all sprites for minos. This is used to render
+            the colors and palettes of the stamp on a cache miss.
         """
 
-        shape_data = tetromino.get_shape_data()
-
-        # Loop through each of the 16 slots in the 4x4 shape data grid.
-        # `i` will be the index from 0-15.
-        # `tile_col_index` is the value from the bytearray (the sprite's column).
-        for index, tile_col_index in enumerate(shape_data):
-
-            # If the value is 0, it's an empty part of the shape, so we skip it.
-            if tile_col_index == 0:
-                continue
-
-            # --- Step 1: Calculate the destination position ---
-            # First, find the logical (x,y) of this mino within the 4x4 piece grid.
-            mino_grid_x = index % constants.TETROMINO_SHAPE_DATA_SIZE
-            mino_grid_y = index // constants.TETROMINO_SHAPE_DATA_SIZE
-
-            # Now, find the top-left *pixel* coordinate where this mino should be stamped
-            # onto the sand bitmap.
-            dest_start_x = tetromino.x + mino_grid_x * constants.MINO_SIZE
-            dest_start_y = tetromino.y + mino_grid_y * constants.MINO_SIZE
-
-            # --- Step 2: Calculate the source position ---
-            # Find the top-left *pixel* coordinate of the source sprite on the sprite sheet.
-            source_start_x = tile_col_index * constants.MINO_SIZE
-            source_start_y = tetromino.color_type * constants.MINO_SIZE
-
-            # --- Step 3: Copy the 3x3 pixels ---
-            # Now we loop 3x3 times to copy the mino's pixels.
-            for x_offset in range(constants.MINO_SIZE):
-                for y_offset in range(constants.MINO_SIZE):
-
-                    # Calculate the final source pixel to read from
-                    source_x = source_start_x + x_offset
-                    source_y = source_start_y + y_offset
-
-                    # Calculate the final destination pixel to write to
-                    dest_x = dest_start_x + x_offset
-                    dest_y = dest_start_y + y_offset - constants.INFO_BAR_HEIGHT
-                    # the INFO_BAR_HEIGHT accounts for the fact that the playfield area is 5 px below y=0
-
-                    # Safety check to ensure we don't write out of bounds
-                    if (self._coord_within_bounds((dest_x, dest_y))):
+        stamp = self._stamp_cache.get(tetromino.shape_type, tetromino.orientation, tetromino.color_type, sprite_sheet_bitmap)
 
-                        # Copy the pixel's index value from the sprite sheet
-                        # to the sand pile's state bitmap.
-                        pixel_value = sprite_sheet_bitmap[source_x, source_y]
+        # The top-left *pixel* coordinate of the stamp on the sand bitmap.
+        # the INFO_BAR_HEIGHT accounts for the fact that the playfield area is 5 px below y=0
+        dest_x = tetromino.x + stamp.left
+        dest_y = tetromino.y + stamp.top - constants.INFO_BAR_HEIGHT
 
-                        self.sand_state_bitmap[dest_x, dest_y] = pixel_value
-                        self._activate_pixel((dest_x, dest_y))
+        # Clip the rows that fall outside of the playfield (e.g. a piece that lands while still in the info bar)
+        first_row = max(0, -dest_y)
+        last_row = min(stamp.height, constants.PLAYFIELD_HEIGHT - dest_y)
+        if first_row >= last_row:
+            return
 
-    def apply_sand_physics(self):
+        # --- Step 1: Copy the sand in bulk ---
+        self.grid.stamp(stamp, dest_x, dest_y, first_row, last_row)
+        self._bump_generations(dest_y + first_row, dest_y + last_row - 1)
+
+        # --- Step 2: Update the occupancy bitboard and activate the stamped region, a row at a time ---
+        for row in range(first_row, last_row):
+            y = dest_y + row
+
+            stamp_row_mask = stamp.row_masks[row]
+            if dest_x >= 0:
+                stamp_row_mask = (stamp_row_mask << dest_x) & constants.FULL_ROW_MASK
+            else:
+                stamp_row_mask >>= -dest_x
+            self.row_masks[y] |= stamp_row_mask
+            self._raise_column_heights(stamp_row_mask, y)
+            self.active_rows[y] |= stamp_row_mask
+            self.active_row_summary |= 1 << y
+            self._wake_tiles(y, _tile_bits_of_columns(stamp_row_mask))
+
+    def has_unfinished_step(self) -> bool:
+        """ Returns whether the last physics step ran out of budget and will resume on the next call. """
+        return self._resume_y is not None
+
+    def apply_sand_physics(self, max_grains: int = None, max_seconds: float = None):
         """
         Iterates through the SandPile and makes any unsupported sand pixels fall down.
         This version is optimized for performance and more natural-looking physics.
         It is not perfect and there may be a peeling issue with a "race condition"
         due to the nature of the cellular automata simulation.
+
+        With a budget, the step stops after the first row at which it has moved max_grains grains or
+        used max_seconds, and the next call resumes it from the next row up, with the same row parity, so
+        the rows are still visited bottom-up exactly once per step.
+        The budget only applies to the reference engine; the other engines always run whole steps.
+
+        Args:
+            max_grains (int): The grain budget, or None for no limit.
+            max_seconds (float): The time budget, or None for no limit.
+
+        Returns:
+            int: The number of grains that moved.
         """
 
         #start_time = time.monotonic()
 
-        has_any_active_pixels = any(self.active_rows)
-        if not has_any_active_pixels:
-            return
+        if not self.has_active_pixels():
+            self._resume_y = None
+            self._sleep_awake_tiles()
+            return 0
 
 
         # To create a more natural, random, less frantic-looking sand cascade, we only
@@ -161,47 +660,91 @@ class SandPile:
 
         # Flip the boolean to alternate between processing even and odd rows each frame,
         # creating a "zebra stripe" pattern of updates over time.
-        self.odd_rows = not self.odd_rows
-
-        grid = self.sand_state_bitmap
+        # A step that is resumed keeps the parity it started with.
+        if self._resume_y is None:
+            self.odd_rows = not self.odd_rows
+
+        if self._engine is not None:
+            # The engines move whole blocks and rows of grains at once, so the skyline is rebuilt after them
+            num_moved = self._engine.step(self)
+            if num_moved:
+                self._recompute_column_heights()
+                self._bump_generations(0, constants.PLAYFIELD_HEIGHT - 1)
+            return num_moved
+
+        cells = self.grid.cells
+        row_masks = self.row_masks
+        active_rows = self.active_rows
+        active_row_summary = self.active_row_summary
+        column_heights = self._column_heights
+        band_generations = self.band_generations
+        random_bits = self.random_bits
+        bit_index = random_bits.bit_index
         grid_width = constants.GAME_WIDTH
         grid_height = constants.PLAYFIELD_HEIGHT
+        tile_shift = constants.SAND_TILE_SHIFT
+        num_moved = 0
+        dirty_first_y = self._dirty_first_y
+        dirty_last_y = self._dirty_last_y
+        deadline = time.monotonic() + max_seconds if max_seconds is not None else None
+        resume_y = None
 
         # This loop iterates from the bottom-up, but with a step of -2, processing
         # only every other row. The 'odd_rows' boolean determines whether we start
         # on an even or odd row, creating the interlaced "zebra" effect. This is an
         # intentional visual choice to make large cascades look less uniform and more
         # granular, as it creates temporary "holes" that fill in on the next frame.
-        for y in range(grid_height - 1 - self.odd_rows, -1, -2):
+        first_y = self._resume_y if self._resume_y is not None else grid_height - 1 - self.odd_rows
+
+        for y in range(first_y, -1, -2):
 
             # If the row has no active pixels, we skip that row
-            if not self.active_rows[y]:
+            if not (active_row_summary >> y) & 1:
                 continue
 
-            # Iterate through all x values in the row
-            while self.active_rows[y]:
-
-                x = self.active_rows[y].pop()
-
-                # Check for bounds. We do not use self._coord_within_bounds() for performance.
-                # We also make sure it excludes the bottom row. We need to do this, because
-                # the code checks and manipulates the row below the current y value.
+            # Take the whole row's active pixels at once. Moves only ever activate the rows
+            # above and below, which are not part of this pass, so nothing is added to row y meanwhile.
+            active_mask = active_rows[y]
+            active_rows[y] = 0
+            active_row_summary &= ~(1 << y)
+
+            # Flat index of the first pixel of this row and of the row below it.
+            # Every backend is indexed as cells[y * grid_width + x].
+            row_start = y * grid_width
+            below_row_start = row_start + grid_width
+
+            # Iterate through the active x values in the row.
+            # Bit 0 of active_mask always belongs to column x + 1.
+            num_moved_before_row = num_moved
+            x = -1
+            while active_mask:
+
+                # Skip 8 idle columns at a time
+                if not active_mask & 0xFF:
+                    active_mask >>= 8
+                    x += 8
+                    continue
 
-                if (not (0 <= x < grid_width and 0 <= y < grid_height)):
+                x += 1
+                is_active = active_mask & 1
+                active_mask >>= 1
+                if not is_active:
                     continue
 
+                index = row_start + x
+
                 # Check if there is no sand at that pixel, if so, we skip this pixel.
-                if (grid[x, y] == 0):
+                if (cells[index] == 0):
                     continue
 
                 # --- PHYSICS LOGIC ---
 
-                new_pos = None  # The new position that the pixel moves to (if it moves)
+                new_x = -1  # The new x position that the pixel moves to in the row below (if it moves)
 
                 # STEP 1) CHECK IF THE PIXEL CAN GO DOWN
 
-                if (y + 1 < grid_height and grid[x, y + 1] == 0):
-                    new_pos = (x, y + 1)
+                if (y + 1 < grid_height and cells[below_row_start + x] == 0):
+                    new_x = x
 
                 # STEP 2) CHECK IF THE PIXEL CAN GO DIAGONALLY
                 #         DOWN TO ENSURE RANDOMNESS, IT WILL RANDOMLY CHOOSE
@@ -210,40 +753,84 @@ class SandPile:
                 #         GO DIAGONALLY, SINCE THAT WOULD MEAN IT WOULD USE A
                 #         "FLOATING PIXEL" AS A PIVOT.
 
-                else:
-                    if (y + 2 < grid_height and grid[x, y+2] == 0):
+                elif y + 1 < grid_height:
+                    if (y + 2 < grid_height and cells[below_row_start + grid_width + x] == 0):
                         # This means it's trying to use a "floating" pixel as a pivot
                         # if that is the case, we don't do anything with this pixel.
                         continue
 
-                    direction = 1 if random.getrandbits(1) else -1
+                    # Take the next bit from the pre-generated pool (see RandomBitPool)
+                    if bit_index >= random_bits.num_bits:
+                        random_bits.refill()
+                        bit_index = 0
+                    direction = 1 if (random_bits.bits[bit_index >> 3] >> (bit_index & 7)) & 1 else -1
+                    bit_index += 1
 
                     # CHECK THE BOUNDARIES OF THE DIAGONAL IN THE RANDOM DIRECTION. ALSO CHECK IF DIAGONAL IS EMPTY.
-                    if (0 <= (x + direction) < grid_width and 0 <= y + 1 < grid_height) and (grid[x + direction, y + 1] == 0):
+                    if 0 <= (x + direction) < grid_width and cells[below_row_start + x + direction] == 0:
                         # IF IT IS, THEY SWAP
-                        new_pos = (x + direction, y + 1)
+                        new_x = x + direction
                     # IF THE FIRST DIAGONAL FAILS, CHECK THE OTHER DIAGONAL.
-                    elif (0 <= (x - direction) < grid_width and 0 <= y + 1 < grid_height) and (grid[x - direction, y + 1] == 0):
-                        new_pos = (x - direction, y + 1)
+                    elif 0 <= (x - direction) < grid_width and cells[below_row_start + x - direction] == 0:
+                        new_x = x - direction
 
 
                 # UPDATE THE GRID AND WAKE UP NEIGHBORS
-                if new_pos is not None:
+                if new_x >= 0:
 
                     # Actually move the pixel
-                    grid[new_pos[0], new_pos[1]] = grid[x, y]
-                    grid[x, y] = 0
+                    cells[below_row_start + new_x] = cells[index]
+                    cells[index] = 0
+                    row_masks[y] &= ~(1 << x)
+                    row_masks[y + 1] |= 1 << new_x
+                    num_moved += 1
+
+                    # The skyline: if the grain was the top of its column, the new top is one row down,
+                    # where either the grain itself or the grain it slid off of is.
+                    if column_heights[x] == grid_height - y:
+                        column_heights[x] = grid_height - y - 1
+                    if column_heights[new_x] < grid_height - y - 1:
+                        column_heights[new_x] = grid_height - y - 1
 
                     # The pixel moved, leaving a hole. The pixels above it might now be unstable.
                     # We must add them to the active set for the next frame so they get checked.
+                    # (7 << x) >> 1 covers above-left, above and above-right, clipped at the walls.
+                    # Their tiles wake up at the end of the step (see _update_sleeping_tiles).
 
                     if y - 1 >= 0:
-                        self.active_rows[y-1].add(x)  # Above
-                        if x - 1 >= 0: self.active_rows[y-1].add(x-1)  # Above-Left
-                        if x + 1 < grid_width: self.active_rows[y-1].add(x+1)  # Above-Right
-
-                    # We also need to add the new_pos, as it might fall again.
-                    self.active_rows[new_pos[1]].add(new_pos[0])
+                        active_rows[y - 1] |= ((7 << x) >> 1) & constants.FULL_ROW_MASK
+                        active_row_summary |= 1 << (y - 1)
+
+                    # We also need to add the new position, as it might fall again.
+                    active_rows[y + 1] |= 1 << new_x
+                    active_row_summary |= 1 << (y + 1)
+
+            # Moves change rows y and y + 1
+            if num_moved != num_moved_before_row:
+                band_generations[y >> tile_shift] += 1
+                band_generations[(y + 1) >> tile_shift] += 1
+                if y < dirty_first_y:
+                    dirty_first_y = y
+                if y + 1 > dirty_last_y:
+                    dirty_last_y = y + 1
+
+            # Out of budget: the next call carries on with the next row up
+            if y >= 2 and (
+                (max_grains is not None and num_moved >= max_grains) or
+                (deadline is not None and time.monotonic() >= deadline)
+            ):
+                resume_y = y - 2
+                break
+
+        self.active_row_summary = active_row_summary
+        self._dirty_first_y = dirty_first_y
+        self._dirty_last_y = dirty_last_y
+        random_bits.bit_index = bit_index
+
+        # Tiles only count quiet steps for whole steps
+        self._resume_y = resume_y
+        if resume_y is None:
+            self._update_sleeping_tiles()
 
         #end_time = time.monotonic()
 
@@ -251,11 +838,87 @@ class SandPile:
         #if end_time - start_time >= constants.TICK_RATE:
         #    print(" --------------------------- Too slow --------------------")
 
+        return num_moved
+
+    def find_lines(self):
+        """
+        Finds the continuous paths of same-colored sand from left to right, without clearing them.
+        The paths come from the connectivity structure (see sand_connectivity.py), which is kept up to date
+        as the sand settles, so a call without anything to find is a scan of the 59 row masks.
+
+        Returns:
+            list: The flat indices of the grains on the paths in increasing order; None or empty if there are none. They are taken
+            out of the connectivity structure; clear them with erase_grains and release_grains_above.
+        """
+        connectivity = self.connectivity
+
+        # Settled grains only move after a clear. Their old components are gone, so start over with what is settled now.
+        if connectivity.has_departures(self.row_masks):
+            connectivity.reset()
+            self._register_sleeping_tiles()
+
+        if not connectivity.has_spanning_component():
+            return None
+
+        grains = connectivity.take_spanning_components(self.grid.cells)
+        if grains is None:
+            # A grain changed color under a registered cell; rebuild and look again next time
+            connectivity.reset()
+            self._register_sleeping_tiles()
+        return grains
+
+    def mark_grains(self, grains, value: int):
+        """ Recolors the grains at the given flat indices with palette index `value`, e.g. SAND_FLASH_INDEX. """
+        cells = self.grid.cells
+        for index in grains:
+            cells[index] = value
+        # The grains are in flat index order (see find_lines), so the first and last give the row span
+        self._mark_dirty(grains[0] // constants.GAME_WIDTH, grains[-1] // constants.GAME_WIDTH)
+
+    def erase_grains(self, grains, first: int = 0, last: int = None):
+        """
+        Removes the grains at the flat indices grains[first:last] without activating anything, so the sand
+        around them stays where it is until release_grains_above.
+        """
+        if last is None:
+            last = len(grains)
+
+        cells = self.grid.cells
+        row_masks = self.row_masks
+        grid_width = constants.GAME_WIDTH
+        for i in range(first, last):
+            index = grains[i]
+            cells[index] = 0
+            row_masks[index // grid_width] &= ~(1 << (index % grid_width))
+            self.band_generations[(index // grid_width) >> constants.SAND_TILE_SHIFT] += 1
+
+        if first < last:
+            self._mark_dirty(grains[first] // grid_width, grains[last - 1] // grid_width)
+        self._recompute_column_heights()
+
+    def release_grains_above(self, grains):
+        """ Activates the pixels above the given (erased) grains so that the sand falls into the gap. """
+        grid_width = constants.GAME_WIDTH
+        for index in grains:
+            x = index % grid_width
+            y = index // grid_width
+            # Some of these cells were erased too; empty cells cost nothing
+            for neighbor_x in (x - 1, x, x + 1):
+                self._activate_pixel((neighbor_x, y - 1))
+
     def find_and_clear_lines(self):
         """
         Finds any continuous paths of same-colored sand from left to right.
         If found, clears them and returns the number of points scored.
         Returns the number of cleared sand pixels.
+
+        This clears everything at once; the game animates it over several frames instead (see line_clear.py).
         """
-        pass
+        grains = self.find_lines()
+        if not grains:
+            return 0
+
+        self.erase_grains(grains)
+        self.release_grains_above(grains)
+        return len(grains)
 
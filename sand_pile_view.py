@@ -2,7 +2,10 @@
 
 import constants
 
-import displayio
+try:
+    import displayio
+except ImportError:
+    import headless_displayio as displayio  # off the board (see headless.py)
 
 class SandPileView:
     """
@@ -30,7 +33,14 @@ class SandPileView:
             root_group (displayio.Group): The root_group connected to the display.
         """
 
-        self.sand_palette = sprite_sheet_palette
+        # A copy of the master palette with one extra entry, SAND_FLASH_INDEX, for the line clear flash.
+        # Its color can be swapped without touching the tetromino's palette or the bitmap.
+        self.sand_palette = displayio.Palette(max(len(sprite_sheet_palette), constants.SAND_FLASH_INDEX + 1))
+        for index in range(len(sprite_sheet_palette)):
+            self.sand_palette[index] = sprite_sheet_palette[index]
+            if sprite_sheet_palette.is_transparent(index):
+                self.sand_palette.make_transparent(index)
+        self.sand_palette[constants.SAND_FLASH_INDEX] = constants.SAND_FLASH_COLOR
 
         self.sand_state_bitmap = displayio.Bitmap(
             constants.GAME_WIDTH,  # width
@@ -54,3 +64,10 @@ class SandPileView:
         root_group.insert(0, self._sand_tile_grid)
         # No dedicated sand_group needed, as the sand_tilegrid is a single visual object that never moves.
 
+    def set_flash_color(self, color: int):
+        """ Changes the color of the grains marked with SAND_FLASH_INDEX. """
+        self.sand_palette[constants.SAND_FLASH_INDEX] = color
+
+    def get_color(self, palette_index: int) -> int:
+        """ Returns the color of a palette index, e.g. to flash a path in its own color. """
+        return self.sand_palette[palette_index]
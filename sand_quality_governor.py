@@ -0,0 +1,89 @@
+# sand_quality_governor.py
+
+import constants
+
+
+class SandQualityGovernor:
+    """
+    Keeps the frame rate smooth under heavy sand by trading sand quality for time. It watches the load
+    (the share of time the game loop spends working rather than sleeping) over windows of
+    GOVERNOR_WINDOW_FRAMES frames, and moves between the SAND_QUALITY_LEVELS:
+
+        load > GOVERNOR_HIGH_LOAD: one level down (fewer sand steps per second, a smaller budget per step)
+        load < GOVERNOR_LOW_LOAD for GOVERNOR_RESTORE_WINDOWS windows in a row: one level back up
+
+    The gap between the two thresholds and the restore delay are the hysteresis that keeps it from
+    flipping between two levels every window.
+
+    Attributes:
+        level (int): The active quality level, 0 being full quality. Read it for telemetry.
+        sand_time_budget (float): The time budget for apply_sand_physics at the active level.
+    """
+
+    def __init__(self, sand_rate):
+        """
+        Args:
+            sand_rate (scheduler.FixedRate): The scheduler's sand physics rate, which the governor adjusts.
+        """
+        self._sand_rate = sand_rate
+
+        self.level = 0
+        self.sand_time_budget = 0.0
+        self.last_load = 0.0
+        self.num_level_changes = 0
+
+        self._busy_time = 0.0
+        self._elapsed_time = 0.0
+        self._num_frames = 0
+        self._num_calm_windows = 0
+
+        self._apply_level()
+
+    def _apply_level(self):
+        sand_physics_rate, self.sand_time_budget = constants.SAND_QUALITY_LEVELS[self.level]
+        self._sand_rate.set_rate(sand_physics_rate)
+
+    def record_frame(self, frame_time: float, elapsed: float) -> bool:
+        """
+        Adds one frame to the current window, and at the end of the window decides on the level.
+
+        Args:
+            frame_time (float): The time the frame spent working.
+            elapsed (float): The time since the previous frame started (working and sleeping).
+
+        Returns:
+            bool: Whether the level changed.
+        """
+        self._busy_time += frame_time
+        self._elapsed_time += elapsed
+        self._num_frames += 1
+
+        if self._num_frames < constants.GOVERNOR_WINDOW_FRAMES:
+            return False
+
+        load = self._busy_time / self._elapsed_time if self._elapsed_time > 0 else 0.0
+        self.last_load = load
+        self._busy_time = 0.0
+        self._elapsed_time = 0.0
+        self._num_frames = 0
+
+        new_level = self.level
+        if load > constants.GOVERNOR_HIGH_LOAD:
+            self._num_calm_windows = 0
+            if self.level < len(constants.SAND_QUALITY_LEVELS) - 1:
+                new_level = self.level + 1
+        elif load < constants.GOVERNOR_LOW_LOAD:
+            self._num_calm_windows += 1
+            if self._num_calm_windows >= constants.GOVERNOR_RESTORE_WINDOWS and self.level > 0:
+                self._num_calm_windows = 0
+                new_level = self.level - 1
+        else:
+            self._num_calm_windows = 0
+
+        if new_level == self.level:
+            return False
+
+        self.level = new_level
+        self.num_level_changes += 1
+        self._apply_level()
+        return True
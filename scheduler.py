@@ -0,0 +1,92 @@
+# scheduler.py
+
+import constants
+
+
+class FixedRate:
+    """
+    A fixed-timestep accumulator for one part of the game. Every frame, the real time that passed is added
+    to the accumulator, and each whole step in it is one update that is due. If more than max_steps are due
+    (after a long frame), only max_steps run and the rest of the lag is dropped, so one slow frame
+    cannot snowball into ever longer catch-up frames.
+    """
+
+    # Absorbs the rounding error of adding up float steps (e.g. 3 * 0.05 landing just below 0.15)
+    _EPSILON = 1e-6
+
+    def __init__(self, rate: float, max_steps: int = 1):
+        """
+        Args:
+            rate (float): Updates per second.
+            max_steps (int): The most updates that run in one frame.
+        """
+        self.step = 1.0 / rate
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.num_dropped_steps = 0
+
+    def advance(self, elapsed: float) -> int:
+        """
+        Adds the time that passed since the last frame.
+
+        Returns:
+            int: The number of updates to run this frame.
+        """
+        self.accumulator += elapsed
+
+        num_steps = int((self.accumulator + self._EPSILON) / self.step)
+        if num_steps > self.max_steps:
+            self.num_dropped_steps += num_steps - self.max_steps
+            num_steps = self.max_steps
+            self.accumulator = self.step * num_steps  # drop the lag that will not be caught up
+
+        self.accumulator -= num_steps * self.step
+        if self.accumulator < 0.0:
+            self.accumulator = 0.0
+        return num_steps
+
+    def set_rate(self, rate: float):
+        """ Changes the number of updates per second. Time already accumulated is kept. """
+        self.step = 1.0 / rate
+
+    def time_until_next_step(self) -> float:
+        return self.step - self.accumulator
+
+
+class Scheduler:
+    """
+    Decides, every frame, what the game loop runs: the input polls, fixed simulation steps (the tetromino),
+    sand physics steps and renders, each at its own rate from constants.
+    """
+
+    def __init__(self):
+        self.inputs = FixedRate(constants.INPUT_RATE)
+        self.simulation = FixedRate(constants.SIMULATION_RATE, constants.MAX_SIMULATION_CATCH_UP_STEPS)
+        self.sand = FixedRate(constants.SAND_PHYSICS_RATE, constants.MAX_SAND_CATCH_UP_STEPS)
+        self.render = FixedRate(constants.RENDER_RATE)
+
+        self.num_skipped_renders = 0  # renders skipped in a row while catching up
+
+    def should_render(self, elapsed: float, num_simulation_steps: int) -> bool:
+        """
+        Returns whether a render is due this frame. A due render is skipped when the simulation is behind
+        (it had to run more than one step this frame), unless MAX_SKIPPED_RENDERS were already skipped in a row.
+        """
+        if not self.render.advance(elapsed):
+            return False
+
+        if num_simulation_steps > 1 and self.num_skipped_renders < constants.MAX_SKIPPED_RENDERS:
+            self.num_skipped_renders += 1
+            return False
+
+        self.num_skipped_renders = 0
+        return True
+
+    def time_until_next_step(self) -> float:
+        """ Returns how long the loop can sleep before something is due. """
+        return min(
+            self.inputs.time_until_next_step(),
+            self.simulation.time_until_next_step(),
+            self.sand.time_until_next_step(),
+            self.render.time_until_next_step(),
+        )
@@ -0,0 +1,83 @@
+# stamp_cache.py
+
+from array import array
+
+from lru_cache import LRUCache
+import constants
+
+
+class PieceStamp:
+    """
+    A tetromino pre-rendered at pixel scale, ready to be copied onto the sand grid in bulk.
+    Only the bounding box of the occupied minos is stored (at most 12x12 = 144 bytes).
+
+    Attributes:
+        left, top (int): The offset (in px) of the bounding box within the 12x12 piece area.
+        width, height (int): The size (in px) of the bounding box.
+        pixels (memoryview): width * height palette indices, row by row. 0 means "no sand here".
+        row_masks (array): One occupancy mask per row; bit i is set when column i of the stamp has sand.
+        row_runs (tuple): For every row, the (start, end) column ranges of consecutive sand pixels.
+            Every tetromino row is a single run, so a row is one slice copy.
+    """
+
+    def __init__(self, geometry: constants.ShapeGeometry, color_type: int, sprite_sheet_bitmap):
+        self.left, self.top, self.width, self.height = geometry.bounding_box
+
+        pixels = bytearray(self.width * self.height)
+        row_masks = array("L", [0] * self.height)
+
+        # Copy each occupied mino's 3x3 sprite from the sprite sheet.
+        # The sprite's column comes from the shape data and its row from the color.
+        for mino_grid_x, mino_grid_y, tile_col_index in geometry.minos:
+            source_start_x = tile_col_index * constants.MINO_SIZE
+            source_start_y = color_type * constants.MINO_SIZE
+            stamp_start_x = mino_grid_x * constants.MINO_SIZE - self.left
+            stamp_start_y = mino_grid_y * constants.MINO_SIZE - self.top
+
+            for y_offset in range(constants.MINO_SIZE):
+                for x_offset in range(constants.MINO_SIZE):
+                    pixel_value = sprite_sheet_bitmap[source_start_x + x_offset, source_start_y + y_offset]
+                    stamp_x = stamp_start_x + x_offset
+                    stamp_y = stamp_start_y + y_offset
+
+                    pixels[stamp_y * self.width + stamp_x] = pixel_value
+                    if pixel_value:
+                        row_masks[stamp_y] |= 1 << stamp_x
+
+        self.pixels = memoryview(pixels)
+        self.row_masks = row_masks
+        self.row_runs = tuple(self._find_runs(row_mask) for row_mask in row_masks)
+
+    def _find_runs(self, row_mask: int):
+        runs = []
+        column = 0
+        while column < self.width:
+            if (row_mask >> column) & 1:
+                start = column
+                while column < self.width and (row_mask >> column) & 1:
+                    column += 1
+                runs.append((start, column))
+            else:
+                column += 1
+        return tuple(runs)
+
+
+class StampCache(LRUCache):
+    """
+    A small least-recently-used cache of PieceStamps keyed by (shape, orientation, color).
+    There are 7 * 4 * 5 = 140 possible stamps, which is too much RAM to keep them all, so only
+    the `max_entries` most recently placed ones are kept.
+    """
+
+    def __init__(self, max_entries: int = constants.STAMP_CACHE_SIZE):
+        super().__init__(max_entries)
+
+    def get(self, shape_type: int, orientation: int, color_type: int, sprite_sheet_bitmap) -> PieceStamp:
+        """ Returns the stamp for the given piece, rendering it from the sprite sheet on a miss. """
+        key = (shape_type, orientation, color_type)
+        stamp = super().get(key)
+
+        if stamp is None:
+            stamp = PieceStamp(constants.SHAPE_GEOMETRY[shape_type][orientation], color_type, sprite_sheet_bitmap)
+            self.put(key, stamp)
+        return stamp
@@ -0,0 +1,64 @@
+# test_sand_connectivity.py
+# Run from the repository root with `pytest tests` (not `python -m pytest`, which would put the root on
+# sys.path first, and the board's code.py would shadow the standard library's code module).
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import headless
+from random_pool import RandomBitPool
+
+NUM_GAMES = 30
+# Resets without a clear before them left over in NUM_GAMES games: a piece can overlap settled sand
+# when it lands (e.g. sand that slid under it), and stamping it recolors registered grains.
+MAX_RESETS_WITHOUT_CLEAR = 10
+
+
+def _count_resets(sand_pile):
+    """
+    Wraps the SandPile's find_lines and erase_grains to count the connectivity resets, and those of them
+    that happened while no grain had been cleared since the previous find_lines call.
+    """
+    counts = {"resets": 0, "resets_without_clear": 0}
+    state = {"cleared": False}
+    find_lines = sand_pile.find_lines
+    erase_grains = sand_pile.erase_grains
+
+    def counting_erase_grains(*args, **kwargs):
+        state["cleared"] = True
+        return erase_grains(*args, **kwargs)
+
+    def counting_find_lines():
+        num_resets = sand_pile.connectivity.num_resets
+        grains = find_lines()
+        new_resets = sand_pile.connectivity.num_resets - num_resets
+        counts["resets"] += new_resets
+        if new_resets and not state["cleared"]:
+            counts["resets_without_clear"] += new_resets
+        state["cleared"] = False
+        return grains
+
+    sand_pile.find_lines = counting_find_lines
+    sand_pile.erase_grains = counting_erase_grains
+    return counts
+
+
+def test_settled_grains_rarely_move_after_registration():
+    resets = 0
+    resets_without_clear = 0
+    score = 0
+
+    for game_index in range(NUM_GAMES):
+        random_bits = RandomBitPool(game_index)
+        game = headless.create_headless_game(headless.random_player(random_bits), random_bits)
+        counts = _count_resets(game.sand_pile)
+        game.start_game_loop(fast_forward=True, max_ticks=headless.MAX_TICKS_PER_GAME)
+
+        resets += counts["resets"]
+        resets_without_clear += counts["resets_without_clear"]
+        score += game.score
+
+    assert score > 0  # the games did clear lines, so resets after a clear were exercised
+    assert resets_without_clear <= MAX_RESETS_WITHOUT_CLEAR, (resets_without_clear, resets)
@@ -31,99 +31,28 @@ class Tetromino:
     def get_shape_data(self):
         return constants.SHAPES[self.shape_type][self.orientation]
 
+    def get_geometry(self) -> constants.ShapeGeometry:
+        """ Returns the precomputed geometry (paddings, minos, bounding box, pixel masks) of the current shape and orientation. """
+        return constants.SHAPE_GEOMETRY[self.shape_type][self.orientation]
+
+    def get_pixel_masks(self):
+        """ Returns the 12 pixel row masks of the current shape and orientation (see constants.ShapeGeometry). """
+        return self.get_geometry().pixel_masks
+
     def get_coords(self):
         return (self.x, self.y)
 
     def get_left_padding(self):
-
-        shape_data = self.get_shape_data()
-        array_width = constants.TETROMINO_SHAPE_DATA_SIZE
-        array_height = constants.TETROMINO_SHAPE_DATA_SIZE
-
-        for col in range(array_width):
-
-            column_occupied = False
-
-            for row in range(array_height):
-
-                index = row * array_width + col
-
-                if shape_data[index] != 0:
-                    column_occupied = True
-                    break
-
-            if column_occupied:
-                return col * constants.MINO_SIZE
-
-        return array_width * constants.MINO_SIZE
+        return self.get_geometry().left_padding
 
     def get_right_padding(self):
-
-        shape_data = self.get_shape_data()
-        array_width = constants.TETROMINO_SHAPE_DATA_SIZE
-        array_height = constants.TETROMINO_SHAPE_DATA_SIZE
-
-        for col in range(array_width - 1, -1, -1):  # iterate columns backwards
-
-            column_occupied = False
-
-            for row in range(array_height):
-
-                index = row * array_width + col
-
-                if shape_data[index] != 0:
-                    column_occupied = True
-                    break
-
-            if column_occupied:
-                return ((array_width - 1) - col) * constants.MINO_SIZE
-
-        return array_width * constants.MINO_SIZE
+        return self.get_geometry().right_padding
 
     def get_top_padding(self):
-        shape_data = self.get_shape_data()
-        array_width = constants.TETROMINO_SHAPE_DATA_SIZE
-        array_height = constants.TETROMINO_SHAPE_DATA_SIZE
-
-        for row in range(array_height):
-
-            row_occupied = False
-
-            for col in range(array_width):
-
-                index = row * array_width + col
-
-                if shape_data[index] != 0:
-                    row_occupied = True
-                    break
-
-            if row_occupied:
-                return row * constants.MINO_SIZE
-
-        return array_height * constants.MINO_SIZE
+        return self.get_geometry().top_padding
 
     def get_bottom_padding(self):
-
-        shape_data = self.get_shape_data()
-        array_width = constants.TETROMINO_SHAPE_DATA_SIZE
-        array_height = constants.TETROMINO_SHAPE_DATA_SIZE
-
-        for row in range(array_height - 1, -1, -1):  # iterate rows backwards
-
-            row_occupied = False
-
-            for col in range(array_width):
-
-                index = row * array_width + col
-
-                if shape_data[index] != 0:
-                    row_occupied = True
-                    break
-
-            if row_occupied:
-                return ((array_height - 1) - row) * constants.MINO_SIZE  # returns it in px
-
-        return array_height * constants.MINO_SIZE
+        return self.get_geometry().bottom_padding
 
     def get_next_position(self, dt: float, tilt_angle : float):
         """
@@ -2,7 +2,10 @@
 
 import constants
 
-import displayio
+try:
+    import displayio
+except ImportError:
+    import headless_displayio as displayio  # off the board (see headless.py)
 
 class TetrominoView:
     """
@@ -10,7 +13,8 @@ class TetrominoView:
         (visual components). This includes the Tetromino Group and Tetromino TileGrid.
 
     Its sole responsibility is to visually represent the state of a single Tetromino
-        data model on the screen.
+        data model on the screen, along with its ghost: the same sprites in dimmed colors
+        where the piece would land.
     """
 
     def __init__(
@@ -41,6 +45,28 @@ class TetrominoView:
         self.tetromino_group = displayio.Group()
         self.tetromino_group.append(self.tetromino_tile_grid)
 
+        # The ghost is a second TileGrid on the same sprite sheet with a dimmed copy of the palette,
+        # so it is redrawn in the same way as the piece itself. It goes first to be drawn under the piece.
+        self.ghost_palette = displayio.Palette(len(sprite_sheet_palette))
+        for index in range(len(sprite_sheet_palette)):
+            self.ghost_palette[index] = self._dim_color(sprite_sheet_palette[index])
+            if sprite_sheet_palette.is_transparent(index):
+                self.ghost_palette.make_transparent(index)
+
+        self.ghost_tile_grid = displayio.TileGrid(
+            bitmap=sprite_sheet_bitmap,
+            pixel_shader=self.ghost_palette,
+            width=constants.TETROMINO_SHAPE_DATA_SIZE,
+            height=constants.TETROMINO_SHAPE_DATA_SIZE,
+            tile_width=constants.MINO_SIZE,
+            tile_height=constants.MINO_SIZE,
+        )
+
+        self.ghost_group = displayio.Group()
+        self.ghost_group.append(self.ghost_tile_grid)
+        self.ghost_group.hidden = True
+
+        root_group.append(self.ghost_group)
         root_group.append(self.tetromino_group)
 
         # --- State Tracking Attributes ---
@@ -49,6 +75,16 @@ class TetrominoView:
         #    for shape, color, and orientation.
         self._last_shape_data = None
         self._last_color_type = None
+        # and for the position of the piece and its ghost, to tell whether anything changed at all
+        self._last_position = None
+        self._last_ghost_y = None
+
+    @staticmethod
+    def _dim_color(color: int) -> int:
+        """ Returns the 0xRRGGBB color with each channel shifted right by GHOST_DIM_SHIFT. """
+        channel_mask = 0xFF >> constants.GHOST_DIM_SHIFT
+        channel_mask |= (channel_mask << 8) | (channel_mask << 16)
+        return (color >> constants.GHOST_DIM_SHIFT) & channel_mask
 
     def _redraw_shape_and_color(
         self,
@@ -69,6 +105,7 @@ class TetrominoView:
             row_index = active_tetromino_color_type
             sprite_index = col_index + row_index * constants.NUM_SPRITES_PER_COLOR
             self.tetromino_tile_grid[i] = sprite_index
+            self.ghost_tile_grid[i] = sprite_index
 
             # Creates the tetromino tile grid by parsing and patching the bitmap.
             # It takes the tile from the bitmap that aligns
@@ -99,8 +136,9 @@ class TetrominoView:
         active_tetromino_shape_data : bytes,
         active_tetromino_color_type : constants.ColorType,
         active_tetromino_x : int,
-        active_tetromino_y : int
-    ):
+        active_tetromino_y : int,
+        ghost_y : int = None
+    ) -> bool:
 
         """
         The main public method. Updates the view to match the model,
@@ -113,14 +151,40 @@ class TetrominoView:
                 type value of the active tetromino
             active_tetromino_x (int): The current x-coordinate (in pixels) of the piece
             active_tetromino_y (int): The current y-coordinate (in pixels) of the piece
+            ghost_y (int): The y-coordinate (in pixels) where the piece would land, or None to hide the ghost
+
+        Returns:
+            bool: Whether anything about the piece or its ghost changed on the display.
         """
+        changed = False
+
         # Check if the piece's appearance has changed
         if (active_tetromino_shape_data != self._last_shape_data or
             active_tetromino_color_type != self._last_color_type):
 
             # If it changed, perform the expensive redraw
             self._redraw_shape_and_color(active_tetromino_shape_data, active_tetromino_color_type)
+            changed = True
 
         # Always update the position, which is cheap
-        self._update_position(active_tetromino_x, active_tetromino_y)
+        position = (active_tetromino_x, active_tetromino_y)
+        if position != self._last_position:
+            self._update_position(active_tetromino_x, active_tetromino_y)
+            self._last_position = position
+            changed = True
+
+        # The ghost is hidden when there is none, or when it would sit right under the piece anyway
+        if ghost_y == active_tetromino_y:
+            ghost_y = None
+        if ghost_y != self._last_ghost_y or (ghost_y is not None and changed):
+            if ghost_y is None:
+                self.ghost_group.hidden = True
+            else:
+                self.ghost_group.hidden = False
+                self.ghost_group.x = active_tetromino_x
+                self.ghost_group.y = ghost_y
+            self._last_ghost_y = ghost_y
+            changed = True
+
+        return changed
 
@@ -0,0 +1,110 @@
+# wall_kicks.py
+# The wall kicks a rotation tries, precomputed at import for every shape, rotation and x, so that a rotation
+# only has to check the sand, and only at the positions that are inside the walls.
+#
+# Each kick is (dx, dy, refuse_if_blocked). A kick with refuse_if_blocked set is a probe, not a position the
+# piece can take: it may be outside the walls, and if the piece hits sand there, the rotation is refused
+# without trying the kicks after it.
+
+import constants
+
+# The Super Rotation System kicks for the clockwise rotations, as (dx, dy) in minos with y pointing up,
+# in the order they are tried. The O piece never kicks.
+_SRS_KICKS = {
+    (constants.Orientation.UP, constants.Orientation.RIGHT): ((0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)),
+    (constants.Orientation.RIGHT, constants.Orientation.DOWN): ((0, 0), (1, 0), (1, -1), (0, 2), (1, 2)),
+    (constants.Orientation.DOWN, constants.Orientation.LEFT): ((0, 0), (1, 0), (1, 1), (0, -2), (1, -2)),
+    (constants.Orientation.LEFT, constants.Orientation.UP): ((0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)),
+}
+_SRS_I_KICKS = {
+    (constants.Orientation.UP, constants.Orientation.RIGHT): ((0, 0), (-2, 0), (1, 0), (-2, -1), (1, 2)),
+    (constants.Orientation.RIGHT, constants.Orientation.DOWN): ((0, 0), (-1, 0), (2, 0), (-1, 2), (2, -1)),
+    (constants.Orientation.DOWN, constants.Orientation.LEFT): ((0, 0), (2, 0), (-1, 0), (2, 1), (-1, -2)),
+    (constants.Orientation.LEFT, constants.Orientation.UP): ((0, 0), (1, 0), (-2, 0), (1, -2), (-2, 1)),
+}
+
+# Every x a piece's top-left corner can have (a piece can hang up to its padding past the left wall)
+_SHAPE_PIXELS = constants.TETROMINO_SHAPE_DATA_SIZE * constants.MINO_SIZE
+_MIN_X = -_SHAPE_PIXELS
+
+
+def _classic_kicks():
+    """ The pixel shifts of the CLASSIC order, after the unshifted position: 1 px left, 1 px right, 2 px left, ... """
+    kicks = []
+    for shift in range(1, constants.MAX_SHIFTS + 1):
+        kicks.append((-shift, 0, False))
+        kicks.append((shift, 0, False))
+    return kicks
+
+
+def _srs_kicks(shape_type: int, from_orientation: int, to_orientation: int):
+    """ The SRS kicks in pixels (y pointing down, like the display). """
+    if shape_type == constants.ShapeType.O:
+        return [(0, 0, False)]
+    kicks = _SRS_I_KICKS if shape_type == constants.ShapeType.I else _SRS_KICKS
+    return [
+        (dx * constants.MINO_SIZE, -dy * constants.MINO_SIZE, False)
+        for dx, dy in kicks[(from_orientation, to_orientation)]
+    ]
+
+
+def _is_inside_walls(geometry: constants.ShapeGeometry, x: int) -> bool:
+    """ The same test as Game._tetromino_hits_wall, for a piece with the given geometry at x. """
+    return (
+        x + geometry.left_padding >= 0 and
+        x + _SHAPE_PIXELS - 1 - geometry.right_padding < constants.GAME_WIDTH
+    )
+
+
+def _build_kicks(shape_type: int, from_orientation: int, to_orientation: int, x: int, kick_order: int, interned: dict):
+    """ Returns the wall-legal kicks, in order, for a rotation of a piece at x. """
+    geometry = constants.SHAPE_GEOMETRY[shape_type][to_orientation]
+
+    if kick_order == constants.KickOrder.SRS:
+        kicks = [kick for kick in _srs_kicks(shape_type, from_orientation, to_orientation) if _is_inside_walls(geometry, x + kick[0])]
+        if not kicks:
+            # The SRS kicks are whole minos, which may not be enough for a piece at an odd pixel next to a wall
+            kicks = [kick for kick in _classic_kicks() if _is_inside_walls(geometry, x + kick[0])]
+    elif kick_order == constants.KickOrder.CLASSIC:
+        if _is_inside_walls(geometry, x):
+            kicks = [(0, 0, False)]  # no kick: the piece rotates in place or not at all
+        else:
+            # As before the tables: a rotated piece that pokes through a wall and hits sand where it is does
+            # not rotate; otherwise it is shifted away from the wall (now only to a place free of sand)
+            kicks = [(0, 0, True)] + [kick for kick in _classic_kicks() if _is_inside_walls(geometry, x + kick[0])]
+    else:
+        raise ValueError("Unknown kick order: {}".format(kick_order))
+
+    # Many positions share the same kicks; keep one tuple for each
+    kicks = tuple(kicks)
+    return interned.setdefault(kicks, kicks)
+
+
+def build_kick_tables(kick_order: int = constants.KICK_ORDER):
+    """
+    Builds the kick tables: for every shape and clockwise rotation (from_orientation, to_orientation), a tuple with,
+    for every x, the (dx, dy, refuse_if_blocked) kicks to try in order. Only kicks that stay inside the walls
+    are listed, apart from the probes.
+    """
+    interned = {}
+    tables = {}
+    for shape_type in constants.SHAPES:
+        for from_orientation in range(constants.NUM_ORIENTATIONS):
+            to_orientation = (from_orientation + 1) % constants.NUM_ORIENTATIONS
+            tables[(shape_type, from_orientation, to_orientation)] = tuple(
+                _build_kicks(shape_type, from_orientation, to_orientation, x, kick_order, interned)
+                for x in range(_MIN_X, constants.GAME_WIDTH)
+            )
+    return tables
+
+
+KICK_TABLES = build_kick_tables()
+
+
+def get_kicks(shape_type: int, from_orientation: int, to_orientation: int, x: int):
+    """
+    Returns the (dx, dy, refuse_if_blocked) kicks to try, in order, when a piece at x rotates from
+    from_orientation to to_orientation. Each one is inside the walls, apart from the probes; the caller
+    only has to check the sand.
+    """
+    return KICK_TABLES[(shape_type, from_orientation, to_orientation)][x - _MIN_X]